@@ -29,14 +29,15 @@ class BibliBackend:
         """Return the libraries based on backend config"""
         pass
 
-    def load_progress_begin(self, location):
+    def load_progress_begin(self, location, title: str | None = None):
         self._progress = Progress(self._ls.protocol)
         self._progress.create(self._name)
 
         self._progress.begin(
             self._name,
             WorkDoneProgressBegin(
-                title=f"Retriving backend type `{self._config.backend_type}` from `{location}`",
+                title=title
+                or f"Retriving backend type `{self._config.backend_type}` from `{location}`",
                 # message="libraries loaded",
             ),
         )
@@ -52,7 +53,10 @@ class BibliBackend:
 
     def load_progress_done(self, loaded, location):
         show_message(self._ls, f"Loaded {loaded} entries from `{location}`")
+        self.load_progress_end("Done")
+
+    def load_progress_end(self, message: str):
         self._progress.end(
             self._name,
-            WorkDoneProgressEnd(message="Done"),
+            WorkDoneProgressEnd(message=message),
         )
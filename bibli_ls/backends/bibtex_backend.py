@@ -1,16 +1,55 @@
 import os
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
+from typing import Iterator
+
+import bibtexparser
+from bibtexparser.exceptions import ParsingException
 from bibtexparser.middlewares.latex_encoding import logging
+from bibtexparser.model import Block
 from bibtexparser.writer import Library
 from lsprotocol.types import MessageType
 from pygls.lsp.server import LanguageServer
-from pyzotero.zotero import bibtexparser
 from bibli_ls.backends.backend import BibliBackend
+from bibli_ls.backends.bibtex_splitter import (
+    MIN_CHUNK_SIZE,
+    merge_chunks,
+    parse_bibtex_chunk,
+    record_key_spans,
+    split_bibfile,
+)
 from bibli_ls.bibli_config import BackendConfig
 from bibli_ls.database import BibliLibrary
+from bibli_ls.snapshot import load_snapshot, save_snapshot, snapshot_key
 
 logger = logging.getLogger(__name__)
 
+"""Total size of bibfiles (in bytes) below which they are parsed serially"""
+PARALLEL_PARSE_MIN_SIZE = 1024 * 1024
+
+"""Size of a bibfile (in bytes) from which it is cut into chunks parsed in parallel"""
+CHUNKED_PARSE_MIN_SIZE = 8 * 1024 * 1024
+
+
+def parse_bibfile_blocks(bibfile_path: str, cache: bool = False) -> list[Block]:
+    """Parse a bibfile and save its snapshot if `cache` is set.
+
+    This is a module-level function so that it can run in worker processes.
+    """
+    key = snapshot_key(bibfile_path) if cache else None
+
+    with open(bibfile_path, "r") as bibtex_file:
+        content = bibtex_file.read()
+
+    library: Library = bibtexparser.parse_string(content)
+    record_key_spans(library.blocks, content)
+
+    if key:
+        save_snapshot(bibfile_path, key, library.blocks)
+
+    return library.blocks
+
 
 class BibfileBackend(BibliBackend):
     def __init__(self, name: str, config: BackendConfig, ls: LanguageServer) -> None:
@@ -20,27 +59,163 @@ class BibfileBackend(BibliBackend):
         if config.bibfiles == []:
             logger.warning("No bibfile found.", MessageType.Warning)
 
-    def get_libraries(self):
-        libraries = []
-        total_files = len(self._config.bibfiles)
-        loaded_files = 0
-        total_entries = 0
-        self.load_progress_begin(f"{self._config.bibfiles}")
+    def get_bibfile_paths(self) -> list[str]:
+        """Configured bibfiles, relative paths resolved against the workspace root"""
+        paths = []
         for bibfile_path in self._config.bibfiles:
             if not os.path.isabs(bibfile_path) and self._ls.workspace.root_path:
                 bibfile_path = os.path.join(self._ls.workspace.root_path, bibfile_path)
+            paths.append(bibfile_path)
+        return paths
+
+    def load_bibfile_snapshot(self, bibfile_path: str) -> list[Block] | None:
+        if not self._config.cache:
+            return None
+
+        blocks = load_snapshot(bibfile_path, snapshot_key(bibfile_path))
+        if blocks is not None:
+            logger.info(f"Loaded `{bibfile_path}` from snapshot")
+        return blocks
+
+    def get_parse_workers(self, bibfile_paths: list[str]) -> int:
+        """Number of worker processes to parse `bibfile_paths` with.
+
+        Spawning workers costs more than parsing a few small files, so those
+        are parsed serially. A single file is only worth parallelizing when it
+        is big enough to be cut into chunks.
+        """
+        sizes = [os.path.getsize(p) for p in bibfile_paths]
+        if sum(sizes) < PARALLEL_PARSE_MIN_SIZE:
+            return 1
+
+        workers = self._config.parse_workers or os.cpu_count() or 1
+        if max(sizes) < CHUNKED_PARSE_MIN_SIZE:
+            return min(workers, len(sizes))
+
+        return workers
+
+    def parse_bibfiles(
+        self, bibfile_paths: list[str]
+    ) -> Iterator[tuple[int, list[Block]]]:
+        """Parse bibfiles, yielding `(index, blocks)` in completion order.
 
-            with open(bibfile_path, "r") as bibtex_file:
-                library: Library = bibtexparser.parse_string(bibtex_file.read())
-                total_entries += len(library.entries)
+        Unchanged files are loaded from their snapshots. The others are parsed
+        in a process pool when they are big enough, with huge files cut into
+        chunks (see `split_bibfile`).
+        """
+        pending = []
+        for i, bibfile_path in enumerate(bibfile_paths):
+            blocks = self.load_bibfile_snapshot(bibfile_path)
+            if blocks is None:
+                pending.append(i)
+            else:
+                yield i, blocks
 
-                libraries.append(
-                    BibliLibrary(
-                        library.blocks,
-                        Path(bibfile_path),
+        workers = self.get_parse_workers([bibfile_paths[i] for i in pending])
+        if workers <= 1:
+            for i in pending:
+                yield i, parse_bibfile_blocks(bibfile_paths[i], self._config.cache)
+            return
+
+        logger.info(f"Parsing {len(pending)} bibfiles with {workers} processes")
+        # Workers are spawned rather than forked, the server is multi-threaded
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn")
+        ) as pool:
+            # Future -> (file index, chunk index or None for a whole file)
+            tasks: dict[Future, tuple[int, int | None]] = {}
+            chunks: dict[int, list] = {}
+            remaining_chunks: dict[int, int] = {}
+            keys: dict[int, tuple | None] = {}
+
+            for i in pending:
+                bibfile_path = bibfile_paths[i]
+                size = os.path.getsize(bibfile_path)
+                if size < CHUNKED_PARSE_MIN_SIZE:
+                    future = pool.submit(
+                        parse_bibfile_blocks, bibfile_path, self._config.cache
                     )
-                )
-                self.load_progress_update(bibfile_path, loaded_files, total_files)
+                    tasks[future] = (i, None)
+                    continue
+
+                keys[i] = snapshot_key(bibfile_path) if self._config.cache else None
+                chunk_size = max(MIN_CHUNK_SIZE, size // (workers * 4))
+                bounds = list(split_bibfile(bibfile_path, chunk_size))
+                logger.info(f"Parsing `{bibfile_path}` in {len(bounds)} chunks")
+
+                chunks[i] = [None] * len(bounds)
+                remaining_chunks[i] = len(bounds)
+                for n, bound in enumerate(bounds):
+                    future = pool.submit(parse_bibtex_chunk, bibfile_path, *bound)
+                    tasks[future] = (i, n)
+
+            for future in as_completed(tasks):
+                i, n = tasks[future]
+                if n is None:
+                    yield i, future.result()
+                    continue
+
+                chunks[i][n] = future.result()
+                remaining_chunks[i] -= 1
+                if remaining_chunks[i] > 0:
+                    continue
+
+                blocks = merge_chunks(chunks.pop(i))
+                key = keys.pop(i)
+                if key:
+                    save_snapshot(bibfile_paths[i], key, blocks)
+                yield i, blocks
+
+    def parse_bibfile(self, bibfile_path: str) -> BibliLibrary:
+        ((_, blocks),) = self.parse_bibfiles([bibfile_path])
+        return BibliLibrary(blocks, Path(bibfile_path))
+
+    def get_libraries(self) -> list[BibliLibrary]:
+        bibfile_paths = self.get_bibfile_paths()
+        libraries: list[BibliLibrary | None] = [None] * len(bibfile_paths)
+        total_files = len(bibfile_paths)
+        loaded_files = 0
+        total_entries = 0
+        self.load_progress_begin(f"{self._config.bibfiles}")
+
+        for i, blocks in self.parse_bibfiles(bibfile_paths):
+            library = BibliLibrary(blocks, Path(bibfile_paths[i]))
+            libraries[i] = library
+            total_entries += len(library.entries)
             loaded_files += 1
+            self.load_progress_update(bibfile_paths[i], loaded_files, total_files)
+
         self.load_progress_done(total_entries, f"{self._config.bibfiles}")
-        return libraries
+        # Every bibfile is yielded once, parse errors are raised
+        return [library for library in libraries if library is not None]
+
+    def reload_bibfile(
+        self, bibfile_path: str, libraries: list[BibliLibrary]
+    ) -> list[BibliLibrary] | None:
+        """Re-parse a single bibfile.
+
+        Return a copy of `libraries` (as returned by `get_libraries`) with the
+        library of `bibfile_path` replaced, or None if the file does not belong
+        to this backend or cannot be read.
+        """
+        realpath = os.path.realpath(bibfile_path)
+        for i, path in enumerate(self.get_bibfile_paths()):
+            if os.path.realpath(path) != realpath or i >= len(libraries):
+                continue
+
+            try:
+                library = self.parse_bibfile(path)
+            except OSError as e:
+                logger.error(f"Failed to read bibfile `{path}`: {e}")
+                return None
+            except ParsingException as e:
+                # E.g. a file being written by an editor, keep the previous
+                # library until the next change
+                logger.error(f"Failed to parse bibfile `{path}`: {e}")
+                return None
+
+            libraries = list(libraries)
+            libraries[i] = library
+            return libraries
+
+        return None
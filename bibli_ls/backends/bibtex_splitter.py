@@ -0,0 +1,141 @@
+import io
+import re
+from typing import Iterator
+
+from bibtexparser.library import Library
+from bibtexparser.middlewares.parsestack import default_parse_stack
+from bibtexparser.model import Block, Entry
+from bibtexparser.splitter import Splitter
+
+from bibli_ls.database import KEY_SPAN
+
+"""Smallest chunk (in bytes) a bibfile is cut into"""
+MIN_CHUNK_SIZE = 1024 * 1024
+
+
+def record_key_spans(blocks: list[Block], bibstr: str, line_offset: int = 0):
+    """Record where the key of each entry is declared in `bibstr`.
+
+    The span is stored in the entry's parser metadata under `KEY_SPAN`, with
+    lines shifted by `line_offset`. Blocks must be in the order they appear in
+    `bibstr`, as returned by the splitter.
+    """
+    line = 0
+    line_start = 0
+    for block in blocks:
+        if not isinstance(block, Entry) or not block.raw or block.start_line is None:
+            continue
+
+        while line < block.start_line:
+            newline = bibstr.find("\n", line_start)
+            if newline < 0:
+                break
+            line_start = newline + 1
+            line += 1
+
+        offset = bibstr.find(block.raw, line_start)
+        open_index = re.search(r"[{(]", block.raw)
+        if offset < 0 or not open_index:
+            continue
+
+        key_offset = block.raw.find(block.key, open_index.end())
+        if key_offset < 0:
+            continue
+
+        # The key may be on a line after the `@type{`
+        key_offset += offset
+        key_line = line + bibstr.count("\n", line_start, key_offset)
+        column = key_offset - (bibstr.rfind("\n", 0, key_offset) + 1)
+        block.set_parser_metadata(
+            KEY_SPAN, (key_line + line_offset, column, column + len(block.key))
+        )
+
+
+def find_key_span(bibfile_path: str, key: str) -> tuple[int, int, int] | None:
+    """Find where `key` is declared by scanning a bibfile.
+
+    Fallback for entries that were not parsed from the file they live in, e.g.,
+    entries downloaded by the `zotero_api` backend.
+    """
+    pattern = re.compile(rf"@\w+\s*[{{(]\s*({re.escape(key)})\s*,")
+    with open(bibfile_path, "r") as f:
+        for line_no, line in enumerate(f):
+            m = pattern.search(line)
+            if m:
+                return line_no, m.start(1), m.end(1)
+    return None
+
+
+def split_bibfile(bibfile_path: str, chunk_size: int) -> Iterator[tuple[int, int, int]]:
+    """Cut a bibfile into chunks of roughly `chunk_size` bytes.
+
+    Chunks are only cut before a line starting with `@` at the top level, i.e.
+    outside of any entry, so that every block lies in a single chunk. The file
+    is streamed and never held in memory as a whole.
+
+    Yields `(offset, length, start_line)` of each chunk.
+    """
+    chunk_offset = 0
+    chunk_line = 0
+    offset = 0
+    line_no = 0
+    depth = 0
+    in_block = False
+
+    with open(bibfile_path, "rb") as f:
+        for line in f:
+            if not in_block and line.lstrip().startswith(b"@"):
+                if offset - chunk_offset >= chunk_size:
+                    yield chunk_offset, offset - chunk_offset, chunk_line
+                    chunk_offset, chunk_line = offset, line_no
+                in_block = True
+
+            # Braces are only counted inside blocks, unbalanced braces in
+            # comments between entries must not hide the next boundary.
+            if in_block:
+                depth += line.count(b"{") - line.count(b"}")
+                if depth <= 0:
+                    depth = 0
+                    in_block = False
+
+            offset += len(line)
+            line_no += 1
+
+    if offset > chunk_offset:
+        yield chunk_offset, offset - chunk_offset, chunk_line
+
+
+def parse_bibtex_chunk(
+    bibfile_path: str, offset: int, length: int, start_line: int
+) -> list[Block]:
+    """Split a chunk of a bibfile into blocks.
+
+    Middlewares are not applied, as `@string` macros may be defined in another
+    chunk; see `merge_chunks`. Line numbers of the blocks are relative to the
+    chunk, only the key spans are shifted to the file. This runs in worker
+    processes.
+    """
+    with open(bibfile_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+
+    # Decode the same way as a file opened in text mode
+    chunk = io.TextIOWrapper(io.BytesIO(data)).read()
+    blocks = Splitter(bibstr=chunk).split().blocks
+    record_key_spans(blocks, chunk, start_line)
+    return blocks
+
+
+def merge_chunks(chunks: list[list[Block]]) -> list[Block]:
+    """Merge the blocks of all chunks of a bibfile, in file order.
+
+    The blocks are added to a single library, so that duplicate keys are
+    handled as in a whole-file parse, then the default middlewares resolve
+    `@string` macros across all chunks.
+    """
+    library = Library([block for blocks in chunks for block in blocks])
+
+    for middleware in default_parse_stack(allow_inplace_modification=True):
+        library = middleware.transform(library=library)
+
+    return library.blocks
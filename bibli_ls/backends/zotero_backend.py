@@ -1,23 +1,65 @@
+import json
 import logging
 import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
 from bibtexparser import bibtexparser
 from bibtexparser.middlewares.names import List
+from bibtexparser.library import Library
+from bibtexparser.model import Block, Entry
 from pygls.lsp.server import LanguageServer
-from pyzotero.zotero import Zotero
 
 from bibli_ls.backends.backend import BibliBackend
 from bibli_ls.backends.bibtex_backend import BibfileBackend
-from bibli_ls.bibli_config import BackendConfig
-from bibli_ls.database import BibliLibrary
+from bibli_ls.backends.zotero_client import ZoteroClient
+from bibli_ls.bibli_config import DEFAULT_ZOTERO_FETCH_WORKERS, BackendConfig
+from bibli_ls.database import KEY_SPAN, BibliLibrary
 from bibli_ls.utils import show_message
 
 logger = logging.getLogger(__name__)
 
+"""Number of items requested per page from the Zotero web API"""
+ZOTERO_PAGE_SIZE = 100
+
+"""Attempts at fetching items while the library keeps changing"""
+ZOTERO_FETCH_ATTEMPTS = 3
+
+
+@dataclass
+class ZoteroSyncState:
+    """What the cache file of a Zotero library is up to date with"""
+
+    version: int
+    """Library version of the last sync"""
+
+    citekeys: dict[str, str]
+    """Citekey in the cache file of each Zotero item key"""
+
+    checked: float = 0
+    """Time the library was last checked for changes"""
+
+
+def write_atomic(path: str, content: str):
+    """Replace the file at `path`, readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
 
 class ZoteroBackend(BibliBackend):
-    _zot: Zotero
+    _client: ZoteroClient
+    library_id: str
+    library_type: str
 
     def __init__(self, name: str, config: BackendConfig, ls: LanguageServer):
         super().__init__(name, config, ls)
@@ -32,61 +74,314 @@ class ZoteroBackend(BibliBackend):
         logger.info(
             f"Initializing zotero API connection library_id `{config.library_id}`, library_type `{config.library_type}`",
         )
-        self._zot = Zotero(config.library_id, config.library_type, config.api_key)
+        self.library_id = config.library_id
+        self.library_type = config.library_type
+        self._client = ZoteroClient(
+            config.library_id,
+            config.library_type,
+            config.api_key,
+            pool_size=self.get_fetch_workers(),
+        )
+
+    def get_fetch_workers(self) -> int:
+        """Number of pages of items fetched at the same time, `fetch_workers`
+        with `0` for the default"""
+        return max(1, self._config.fetch_workers or DEFAULT_ZOTERO_FETCH_WORKERS)
 
     def get_cache_file_path(self) -> str | None:
         if not self._ls.workspace.root_path:
             return None
 
-        filename = f".{self._name}_{self._zot.library_type}_{self._zot.library_id}.bib"
+        filename = f".{self._name}_{self.library_type}s_{self.library_id}.bib"
         return os.path.join(self._ls.workspace.root_path, filename)
 
+    def get_sync_state_path(self) -> str | None:
+        cache_file = self.get_cache_file_path()
+        if not cache_file:
+            return None
+        return os.path.splitext(cache_file)[0] + ".sync.json"
+
+    def load_sync_state(self) -> ZoteroSyncState | None:
+        """State of the last sync, None if the cache file is not usable for
+        a delta sync."""
+        cache_file = self.get_cache_file_path()
+        state_file = self.get_sync_state_path()
+        if not cache_file or not state_file or not os.path.exists(cache_file):
+            return None
+
+        try:
+            with open(state_file, "r") as f:
+                return ZoteroSyncState(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring invalid sync state `{state_file}`: {e}")
+            return None
+
+    def get_cache_file_backend(self, cache_file: str) -> BibfileBackend:
+        return BibfileBackend(
+            "cache_file",
+            BackendConfig(
+                backend_type="bibfile",
+                bibfiles=[cache_file],
+                cache=self._config.cache,
+            ),
+            self._ls,
+        )
+
+    def load_cache_file(self, cache_file: str) -> BibliLibrary:
+        return self.get_cache_file_backend(cache_file).get_libraries()[0]
+
+    def load_cache_blocks(self, cache_file: str) -> list[Block]:
+        """Parsed blocks of the cache file, to merge changes into"""
+        bibtex_backend = self.get_cache_file_backend(cache_file)
+        ((_, blocks),) = bibtex_backend.parse_bibfiles([cache_file])
+        return blocks
+
     def get_libraries_cached(self) -> List[BibliLibrary]:
         cache_file = self.get_cache_file_path()
 
         if cache_file and os.path.exists(Path(cache_file)):
             show_message(self._ls, f"Loading from cached library `{cache_file}`")
-            bibtex_backend = BibfileBackend(
-                "cache_file",
-                BackendConfig(backend_type="bibfile", bibfiles=[cache_file]),
-                self._ls,
-            )
-            return bibtex_backend.get_libraries()
+            return [self.load_cache_file(cache_file)]
         else:
             return self.get_libraries()
 
-    def get_libraries(self):
-        count = self._zot.count_items()
-        loaded = 0
-        limit = 100
+    def fetch_item_pages(
+        self, since: int | None
+    ) -> tuple[int, list[str], dict[str, Entry], bool]:
+        """Fetch all pages of items, several at a time, parsing the pages
+        already fetched while waiting for the next ones.
+
+        Return the library version, the keys of the items, their entries and
+        whether all pages were fetched at the same library version.
+        """
+        params: dict = {
+            "format": "json",
+            "include": "bibtex",
+            "limit": ZOTERO_PAGE_SIZE,
+            # New items are added last, without shifting the pages before
+            "sort": "dateAdded",
+            "direction": "asc",
+        }
+        if since is not None:
+            params["since"] = since
+
+        first = self._client.get("/items", params | {"start": 0})
+        version = int(first.headers.get("Last-Modified-Version", 0))
+        total = int(first.headers.get("Total-Results", 0))
+        pages = {0: first.json()}
+        entries = {0: self.parse_items(pages[0])}
+        consistent = True
+        if total:
+            self.load_progress_update(self.library_id, len(pages[0]), total)
 
+        starts = range(ZOTERO_PAGE_SIZE, total, ZOTERO_PAGE_SIZE)
+        with ThreadPoolExecutor(max_workers=self.get_fetch_workers()) as pool:
+            futures: dict[Future, int] = {}
+            for start in starts:
+                page_params = params | {"start": start}
+                futures[pool.submit(self._client.get, "/items", page_params)] = start
+            try:
+                for future in as_completed(futures):
+                    response = future.result()
+                    page_version = int(response.headers.get("Last-Modified-Version", 0))
+                    consistent = consistent and page_version == version
+
+                    start = futures[future]
+                    pages[start] = response.json()
+                    entries[start] = self.parse_items(pages[start])
+                    loaded = sum(len(page) for page in pages.values())
+                    self.load_progress_update(self.library_id, loaded, total)
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+
+        item_keys = [item["key"] for start in sorted(pages) for item in pages[start]]
+        merged = {k: e for start in sorted(entries) for k, e in entries[start].items()}
+        return version, item_keys, merged, consistent
+
+    def fetch_items(
+        self, since: int | None = None
+    ) -> tuple[int, list[str], dict[str, Entry]]:
+        """Fetch items with their BibTeX export, only the ones modified after
+        library version `since` if given. Return the library version the
+        items are current for, the keys of the items and their entries."""
+        for _ in range(ZOTERO_FETCH_ATTEMPTS - 1):
+            version, item_keys, entries, consistent = self.fetch_item_pages(since)
+            if consistent:
+                return version, item_keys, entries
+            # Pages may have shifted, items could be missing
+            logger.info(f"Zotero library `{self.library_id}` changed, fetching again")
+
+        # Changes made while paging are fetched again by the next sync
+        version, item_keys, entries, _ = self.fetch_item_pages(since)
+        return version, item_keys, entries
+
+    def parse_items(self, items: list[dict]) -> dict[str, Entry]:
+        """Entries of `items` by Zotero item key. Notes and attachments have
+        no BibTeX export and are left out."""
+        exported = [item for item in items if item.get("bibtex", "").strip()]
+
+        # Parsing all items at once is much faster than one by one
+        library = bibtexparser.parse_string(
+            "\n".join(item["bibtex"] for item in exported)
+        )
+        entries = [b for b in library.blocks if isinstance(b, Entry)]
+        if len(entries) == len(exported):
+            return {item["key"]: e for item, e in zip(exported, entries)}
+
+        entries_by_item = {}
+        for item in exported:
+            library = bibtexparser.parse_string(item["bibtex"])
+            if library.entries:
+                entries_by_item[item["key"]] = library.entries[0]
+        return entries_by_item
+
+    def sync_all(self) -> tuple[list[Block], ZoteroSyncState]:
+        """Fetch the whole library."""
+        show_message(
+            self._ls,
+            f"Fetching all items from `{self.library_type}` library `{self.library_id}`",
+        )
+        version, _, entries = self.fetch_items()
+
+        citekeys = {item_key: e.key for item_key, e in entries.items()}
+        return list(entries.values()), ZoteroSyncState(version, citekeys)
+
+    def sync_changes(
+        self, cache_file: str, state: ZoteroSyncState
+    ) -> tuple[list[Block], ZoteroSyncState] | None:
+        """Merge the items changed since the last sync into the cache file.
+        Return None if they cannot be merged and the whole library must be
+        fetched instead."""
+        version, item_keys, changed = self.fetch_items(since=state.version)
+        if version == state.version:
+            logger.info(f"Zotero library `{self.library_id}` is up to date")
+            return self.load_cache_blocks(cache_file), state
+
+        since = {"since": state.version}
+        deleted = self._client.get("/deleted", since).json().get("items", [])
+        trash = self._client.get("/items/trash", since | {"format": "versions"})
+        trashed = list(trash.json())
         show_message(
             self._ls,
-            f"Fetching `{count}` items from `{self._zot.library_type}` library `{self._zot.library_id}`",
+            f"Merging {len(item_keys)} changed and {len(deleted) + len(trashed)} "
+            f"removed items from `{self.library_type}` library "
+            f"`{self.library_id}`",
         )
 
-        self.library = BibliLibrary(path=self.get_cache_file_path())
+        citekeys = dict(state.citekeys)
+        shared = Counter(citekeys.values())
+        removed = set()
+        for item_key in [*deleted, *trashed, *item_keys]:
+            citekey = citekeys.pop(item_key, None)
+            if citekey is None:
+                continue
+            if shared[citekey] > 1:
+                logger.info(f"Citekey `{citekey}` is shared by several items")
+                return None
+            removed.add(citekey)
 
-        self.load_progress_begin(self._zot.library_id)
+        blocks = [
+            b
+            for b in self.load_cache_blocks(cache_file)
+            if not (isinstance(b, Entry) and b.key in removed)
+        ]
+        citekeys_in_use = set(citekeys.values())
+        for item_key, entry in changed.items():
+            if entry.key in citekeys_in_use:
+                logger.info(f"Changed item `{item_key}` reuses citekey `{entry.key}`")
+                return None
+            citekeys_in_use.add(entry.key)
+            citekeys[item_key] = entry.key
+        blocks += changed.values()
 
-        for i in range(0, count, limit):
-            items = self._zot.items(start=i, limit=limit, content="bibtex")
-            logger.debug(items)
-            loaded += len(items)
-            items_str = "\n".join(items)
-            bibtexparser.parse_string(items_str, library=self.library)
-            self.load_progress_update(self._zot.library_id, loaded, count)
+        return blocks, ZoteroSyncState(version, citekeys)
 
-        self.load_progress_done(loaded, self._zot.library_id)
+    def write_cache(self, blocks: list[Block]):
+        cache_file = self.get_cache_file_path()
+        if not cache_file:
+            return
 
-        # TODO: Filter out the empty entries
+        show_message(self._ls, f"Writing to bibfile to `{cache_file}`")
+        write_atomic(cache_file, bibtexparser.write_string(Library(blocks)))
 
-        self.load_progress_done(loaded, self._zot.library_id)
+    def write_sync_state(self, state: ZoteroSyncState):
+        state_file = self.get_sync_state_path()
+        if state_file:
+            write_atomic(state_file, json.dumps(asdict(state)))
 
+    def sync(self) -> BibliLibrary:
+        """Sync the library with Zotero. With a cache file from an earlier
+        sync, only the items changed since then are fetched."""
+        synced = None
         cache_file = self.get_cache_file_path()
-        # Writing to file
-        if cache_file:
-            show_message(self._ls, f"Writing to bibfile to `{cache_file}`")
-            bibtexparser.write_file(cache_file, self.library)
+        state = self.load_sync_state()
+        if cache_file and state:
+            try:
+                synced = self.sync_changes(cache_file, state)
+            except Exception as e:
+                logger.warning(f"Delta sync failed, fetching the whole library: {e}")
+
+        if synced is None:
+            synced = self.sync_all()
+
+        blocks, synced_state = synced
+        if synced_state is not state:
+            self.write_cache(blocks)
+            # Keys moved in the written file, they are searched in it instead
+            for block in blocks:
+                if isinstance(block, Entry):
+                    block.set_parser_metadata(KEY_SPAN, None)
+        # Written last, the state never claims changes the cache file lacks
+        synced_state.checked = time.time()
+        self.write_sync_state(synced_state)
+        return BibliLibrary(blocks, Path(cache_file) if cache_file else None)
+
+    def get_libraries(self):
+        self.load_progress_begin(self.library_id)
+        self.library = self.sync()
+        self.load_progress_done(len(self.library.entries), self.library_id)
+        return [self.library]
+
+    def is_cache_stale(self) -> bool:
+        """Whether the cache file was last checked for changes more than
+        `cache_max_age` seconds ago."""
+        state = self.load_sync_state()
+        if state is None:
+            return True
+        return time.time() - state.checked >= self._config.cache_max_age
+
+    def library_changed(self, version: int) -> bool:
+        """Whether the library was modified after `version`, at the cost of a
+        request answered without items when it was not."""
+        response = self._client.get(
+            "/items",
+            {"format": "versions", "limit": 1},
+            headers={"If-Modified-Since-Version": str(version)},
+        )
+        return response.status_code != 304
+
+    def revalidate(self) -> list[BibliLibrary] | None:
+        """Check the cache file against Zotero, syncing it if the library
+        changed. Return None if the cache file is up to date."""
+        self.load_progress_begin(
+            self.library_id,
+            f"Checking `{self.library_type}` library `{self.library_id}` for changes",
+        )
+        try:
+            state = self.load_sync_state()
+            if state is not None and not self.library_changed(state.version):
+                state.checked = time.time()
+                self.write_sync_state(state)
+                self.load_progress_end("Up to date")
+                return None
+
+            self.library = self.sync()
+        except BaseException:
+            self.load_progress_end("Failed")
+            raise
 
+        self.load_progress_done(len(self.library.entries), self.library_id)
         return [self.library]
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+"""Zotero web API"""
+ZOTERO_API_ENDPOINT = "https://api.zotero.org"
+
+"""Version of the Zotero web API the client speaks"""
+ZOTERO_API_VERSION = "3"
+
+"""Seconds to wait for the Zotero web API to answer a request"""
+ZOTERO_TIMEOUT = 30
+
+"""Attempts at a request failing with a transient error"""
+ZOTERO_MAX_ATTEMPTS = 4
+
+"""Seconds to wait before the first retry, doubled for every next one"""
+ZOTERO_RETRY_DELAY = 0.5
+
+"""Statuses of transient errors, worth retrying"""
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class ZoteroClient:
+    """Zotero web API client which can be shared by several threads.
+
+    Connections are kept alive and reused. A `Backoff` or `Retry-After` header
+    holds back all requests of the client until it expires, and requests
+    failing with a transient error are retried.
+    """
+
+    endpoint: str
+    prefix: str
+
+    def __init__(
+        self,
+        library_id: str,
+        library_type: str,
+        api_key: str | None,
+        pool_size: int = 1,
+        endpoint: str = ZOTERO_API_ENDPOINT,
+    ):
+        self.endpoint = endpoint
+        self.prefix = f"/{library_type}s/{library_id}"
+
+        self._session = requests.Session()
+        self._session.headers["Zotero-API-Version"] = ZOTERO_API_VERSION
+        if api_key:
+            self._session.headers["Zotero-API-Key"] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        # Time until which the server asked not to send requests
+        self._backoff_until = 0.0
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._session.close()
+
+    def _wait_for_backoff(self):
+        while True:
+            with self._lock:
+                remaining = self._backoff_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def _set_backoff(self, response: requests.Response) -> float | None:
+        """Hold back requests as long as asked by `response`. Return the
+        duration in seconds, None if the response did not ask for any."""
+        delay = response.headers.get("Backoff") or response.headers.get(
+            "Retry-After"
+        )
+        if delay is None:
+            return None
+
+        try:
+            seconds = float(delay)
+        except ValueError:
+            logger.warning(f"Ignoring invalid backoff `{delay}`")
+            return None
+
+        logger.info(f"Zotero asked to back off for {seconds}s")
+        with self._lock:
+            self._backoff_until = max(
+                self._backoff_until, time.monotonic() + seconds
+            )
+        return seconds
+
+    def get(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> requests.Response:
+        """GET `path` of the library, retrying transient errors."""
+        url = self.endpoint + self.prefix + path
+        attempt = 1
+        while True:
+            self._wait_for_backoff()
+            can_retry = attempt < ZOTERO_MAX_ATTEMPTS
+            retry_delay = ZOTERO_RETRY_DELAY * 2 ** (attempt - 1)
+            attempt += 1
+
+            try:
+                response = self._session.get(
+                    url, params=params, headers=headers, timeout=ZOTERO_TIMEOUT
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not can_retry:
+                    raise
+                logger.info(f"Retrying `{url}` after error: {e}")
+                time.sleep(retry_delay)
+                continue
+
+            backoff = self._set_backoff(response)
+            if response.status_code not in RETRY_STATUSES or not can_retry:
+                response.raise_for_status()
+                return response
+
+            logger.info(f"Retrying `{url}` after status {response.status_code}")
+            if backoff is None:
+                time.sleep(retry_delay)
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+"""JSON-RPC endpoint of Better BibTeX in a running Zotero"""
+BBT_URL = "http://localhost:23119/better-bibtex/json-rpc"
+
+"""Seconds to wait for Better BibTeX, Zotero runs on the same machine"""
+BBT_TIMEOUT = 2
+
+"""Seconds the attachments of an item are reused without asking again"""
+BBT_CACHE_TTL = 300
+
+
+class BetterBibTeXClient:
+    """Client of the Better BibTeX JSON-RPC API, see
+    https://retorque.re/zotero-better-bibtex/exporting/json-rpc/index.html
+
+    The connection to Zotero is kept alive, several items are looked up with a
+    single batch request, and the results are cached for `ttl` seconds.
+    """
+
+    url: str
+    timeout: float
+    ttl: float
+
+    def __init__(
+        self,
+        url: str = BBT_URL,
+        timeout: float = BBT_TIMEOUT,
+        ttl: float = BBT_CACHE_TTL,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.ttl = ttl
+        self._session = None
+        # citekey -> (expiry time, attachment URIs)
+        self._attachments: dict[str, tuple[float, list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _post(self, payload: Any) -> Any:
+        # requests is only needed when attachments are opened through Zotero
+        import requests
+
+        # Requests may be sent from several threads, they share one session
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+            session = self._session
+        response = session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_attachments(self, citekeys: list[str]) -> dict[str, list[str]]:
+        """Look up the attachments of `citekeys` in one batch request."""
+        payload = [
+            {"jsonrpc": "2.0", "method": "item.attachments", "params": [k], "id": i}
+            for i, k in enumerate(citekeys)
+        ]
+        responses = self._post(payload)
+        if isinstance(responses, dict):
+            # A single error for the whole batch
+            raise ValueError(responses.get("error", responses))
+
+        attachments = {}
+        for response in responses:
+            citekey = citekeys[response["id"]]
+            if "error" in response:
+                logger.debug(f"No attachments for `{citekey}`: {response['error']}")
+                attachments[citekey] = []
+                continue
+            attachments[citekey] = [
+                a["open"] for a in response.get("result") or [] if a.get("open")
+            ]
+        return attachments
+
+    def get_attachments(self, citekeys: list[str]) -> dict[str, list[str]]:
+        """Attachment URIs of each of `citekeys`. Items which could not be
+        looked up, e.g. because Zotero is not running, are left out."""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for citekey in citekeys:
+                cached = self._attachments.get(citekey)
+                if cached and cached[0] > now:
+                    result[citekey] = cached[1]
+
+        missing = list(dict.fromkeys(k for k in citekeys if k not in result))
+        if not missing:
+            return result
+
+        try:
+            fetched = self._fetch_attachments(missing)
+        except Exception as e:
+            logger.warning(f"Failed to get attachments from Better BibTeX: {e}")
+            return result
+
+        with self._lock:
+            expiry = time.monotonic() + self.ttl
+            for citekey, uris in fetched.items():
+                self._attachments[citekey] = (expiry, uris)
+        return result | fetched
+
+    def get_attachment_uri(
+        self, citekey: str, prefetch: list[str] | None = None
+    ) -> str | None:
+        """First attachment URI of `citekey`. The attachments of the items in
+        `prefetch` are looked up in the same request, to be cached."""
+        keys = [citekey] + (prefetch or [])
+        uris = self.get_attachments(keys).get(citekey)
+        return uris[0] if uris else None
+
+    def clear(self):
+        with self._lock:
+            self._attachments.clear()
@@ -35,6 +35,24 @@ DEFAULT_WRAP = 80
 """Default character limit"""
 DEFAULT_CHAR_LIMIT = 400
 
+"""Default seconds to wait after the last change before diagnosing a document"""
+DEFAULT_DIAGNOSTIC_DELAY = 0.3
+
+"""Default maximum number of completion items sent at once"""
+DEFAULT_COMPLETION_MAX_ITEMS = 50
+
+"""Default number of pages of items fetched at the same time from Zotero"""
+DEFAULT_ZOTERO_FETCH_WORKERS = 4
+
+"""Default seconds a Zotero cache file is used without checking for changes"""
+DEFAULT_ZOTERO_CACHE_MAX_AGE = 600
+
+"""Default path of the SQLite library store, relative to the workspace root"""
+DEFAULT_STORAGE_PATH = ".bibli/library.sqlite3"
+
+"""Default extensions of files searched for citations"""
+DEFAULT_REFERENCE_EXTENSIONS = [".md", ".markdown", ".qmd", ".rmd", ".tex", ".org"]
+
 
 @dataclass
 class ViewConfig:
@@ -124,6 +142,54 @@ class CompletionConfig:
 
     doc_format: DocFormatingConfig = field(default_factory=lambda: DocFormatingConfig())
 
+    max_items: int = DEFAULT_COMPLETION_MAX_ITEMS
+    """
+    Maximum number of items sent for each completion request, the best matches
+    of the typed citekey first. `0` sends all items.
+    """
+
+
+@dataclass
+class ReferencesConfig:
+    """
+    Configs for `textDocument/references`.
+    """
+
+    file_extensions: list[str] = field(
+        default_factory=lambda: list(DEFAULT_REFERENCE_EXTENSIONS)
+    )
+    """Extensions of the workspace files indexed for citations"""
+
+
+@dataclass
+class DiagnosticConfig:
+    """
+    Configs for diagnostics.
+    """
+
+    delay: float = DEFAULT_DIAGNOSTIC_DELAY
+    """
+    Seconds to wait after the last change to a document before diagnosing it.
+    Changes made in between are diagnosed together.
+    """
+
+
+@dataclass
+class StorageConfig:
+    """
+    Configs for storing the entries of all libraries.
+    """
+
+    engine: str = "memory"
+    """
+    `memory` or `sqlite`. `sqlite` keeps the entries in a SQLite database
+    instead of in memory, and answers requests from the libraries stored by the
+    previous session while the backends load again.
+    """
+
+    path: str = DEFAULT_STORAGE_PATH
+    """`sqlite` only: Path of the database, relative to the workspace root"""
+
 
 @dataclass
 class BackendConfig:
@@ -146,6 +212,34 @@ class BackendConfig:
     bibfiles: list[str] = field(default_factory=lambda: [])
     """`bibfile` only: List of bibfile paths to load"""
 
+    watch: bool = True
+    """`bibfile` only: Reload a bibfile when it changes on disk"""
+
+    cache: bool = True
+    """
+    Keep a snapshot of parsed bibfiles (including the `zotero_api` cache file)
+    under `$XDG_CACHE_HOME/bibli_ls` to skip parsing unchanged files on startup.
+    """
+
+    parse_workers: int = 0
+    """
+    `bibfile` only: Number of processes parsing bibfiles in parallel. `0` uses
+    all CPUs, `1` always parses serially.
+    """
+
+    fetch_workers: int = DEFAULT_ZOTERO_FETCH_WORKERS
+    """
+    `zotero_api` only: Number of pages of items fetched from Zotero at the same
+    time. `0` uses the default of 4, `1` fetches them one after the other.
+    """
+
+    cache_max_age: int = DEFAULT_ZOTERO_CACHE_MAX_AGE
+    """
+    `zotero_api` only: Seconds after which the cache file is checked for
+    changes. The cache file is used right away on startup, the check and any
+    update happen in the background. `0` checks on every start.
+    """
+
 
 @dataclass
 class NoteConfig(Unionable):
@@ -182,6 +276,7 @@ EXPECTED_VALUES = {
     "library_type": ["user", "group"],
     "doc_format.format": ["table", "list"],
     "view.viewer": ["browser", "zotero", "zotero_bbt"],
+    "storage.engine": ["memory", "sqlite"],
 }
 
 
@@ -200,6 +295,15 @@ class BibliTomlConfig:
     completion: CompletionConfig = field(default_factory=lambda: CompletionConfig())
     """See `CompletionConfig`"""
 
+    references: ReferencesConfig = field(default_factory=lambda: ReferencesConfig())
+    """See `ReferencesConfig`"""
+
+    diagnostic: DiagnosticConfig = field(default_factory=lambda: DiagnosticConfig())
+    """See `DiagnosticConfig`"""
+
+    storage: StorageConfig = field(default_factory=lambda: StorageConfig())
+    """See `StorageConfig`"""
+
     cite: CiteConfig = field(default_factory=lambda: CITE_PRESETS[DEFAULT_CITE_PRESET])
     """See `CiteConfig`"""
 
@@ -230,6 +334,7 @@ class BibliTomlConfig:
         valid |= self.check_expected("doc_format.format", self.hover.doc_format.format)
 
         valid |= self.check_expected("view.viewer", self.view.viewer)
+        valid |= self.check_expected("storage.engine", self.storage.engine)
 
         valid |= self.check_expected(
             "doc_format.format", self.completion.doc_format.format
@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+from pathlib import Path
+
+from lsprotocol import types
+from pygls.workspace import TextDocument
+
+from .bibli_config import CiteConfig
+from .parse import find_cites
+
+logger = logging.getLogger(__name__)
+
+"""Files bigger than this (in bytes) are not indexed"""
+MAX_INDEXED_FILE_SIZE = 8 * 1024 * 1024
+
+"""Directories never indexed, on top of hidden ones"""
+IGNORED_DIRECTORIES = ["node_modules", "__pycache__"]
+
+Occurrences = dict[str, list[types.Range]]
+
+
+def is_ignored_directory(name: str) -> bool:
+    """Whether the files of a directory are never indexed"""
+    return name.startswith(".") or name in IGNORED_DIRECTORIES
+
+
+def find_occurrences(lines: list[str], cite_config: CiteConfig) -> Occurrences:
+    """Map each citekey cited in `lines` to the ranges citing it."""
+    occurrences: Occurrences = {}
+    for line_no, line in enumerate(lines):
+        for cite in find_cites(line, cite_config):
+            occurrences.setdefault(cite.key, []).append(
+                types.Range(
+                    start=types.Position(line=line_no, character=cite.start),
+                    end=types.Position(line=line_no, character=cite.end - 1),
+                )
+            )
+    return occurrences
+
+
+class CiteIndex:
+    """Index of the locations citing each citekey in the workspace.
+
+    The index is built once from the files on disk, then kept up to date
+    lazily: changed files and documents are only marked dirty and re-scanned
+    on the next lookup. Open documents overlay their file on disk, so unsaved
+    edits are taken into account.
+    """
+
+    _cite_config: CiteConfig
+    _extensions: set[str]
+    _root_path: str | None
+    _disk: dict[str, Occurrences]
+    _open: dict[str, Occurrences]
+    _keys: dict[str, set[str]]
+    _dirty_paths: set[str]
+    _dirty_documents: set[str]
+
+    def __init__(self, cite_config: CiteConfig, extensions: list[str]):
+        self._cite_config = cite_config
+        self._extensions = set(extensions)
+        self._root_path = None
+        self._disk = {}
+        self._open = {}
+        self._keys = {}
+        self._dirty_paths = set()
+        self._dirty_documents = set()
+        self._lock = threading.Lock()
+        self._built = threading.Event()
+
+    def is_indexed(self, path: str) -> bool:
+        if os.path.splitext(path)[1] not in self._extensions:
+            return False
+        if not self._root_path:
+            return True
+
+        # Same files as `build` finds
+        relpath = os.path.relpath(path, self._root_path)
+        directories = os.path.dirname(relpath).split(os.sep)
+        return not any(d and is_ignored_directory(d) for d in directories)
+
+    def build(self, root_path: str):
+        """Scan all indexed files under `root_path`. Lookups wait for the scan,
+        and use the files scanned so far if it fails."""
+        logger.info(f"Indexing citations in `{root_path}`")
+        self._root_path = root_path
+        count = 0
+        try:
+            for dirpath, dirnames, filenames in os.walk(root_path):
+                dirnames[:] = [d for d in dirnames if not is_ignored_directory(d)]
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if self.is_indexed(path):
+                        self._scan_path(path)
+                        count += 1
+        except Exception:
+            logger.exception(f"Failed to index citations in `{root_path}`")
+        finally:
+            self._built.set()
+        logger.info(f"Indexed citations in {count} files")
+
+    def build_in_background(self, root_path: str):
+        # Set before the scan starts, changes reported meanwhile are filtered
+        self._root_path = root_path
+        threading.Thread(target=self.build, args=[root_path], daemon=True).start()
+
+    def invalidate_path(self, path: str):
+        """Mark a file changed on disk, it is re-scanned on the next lookup."""
+        if self.is_indexed(path):
+            with self._lock:
+                self._dirty_paths.add(path)
+
+    def invalidate_document(self, uri: str):
+        """Mark an open document as edited."""
+        with self._lock:
+            self._dirty_documents.add(uri)
+
+    def close_document(self, uri: str):
+        """Drop the overlay of a closed document, falling back to its file."""
+        with self._lock:
+            self._dirty_documents.discard(uri)
+            old = self._get_occurrences(uri)
+            self._open.pop(uri, None)
+            self._update_keys(uri, old)
+
+    def find(
+        self, key: str, documents: dict[str, TextDocument]
+    ) -> list[types.Location]:
+        """Locations citing `key`, with `documents` the open text documents."""
+        self._built.wait()
+        self._refresh(documents)
+
+        locations = []
+        with self._lock:
+            for uri in sorted(self._keys.get(key, [])):
+                for range in self._get_occurrences(uri).get(key, []):
+                    locations.append(types.Location(uri=uri, range=range))
+        return locations
+
+    def _refresh(self, documents: dict[str, TextDocument]):
+        with self._lock:
+            dirty_paths, self._dirty_paths = self._dirty_paths, set()
+            dirty_documents, self._dirty_documents = self._dirty_documents, set()
+
+        for path in dirty_paths:
+            self._scan_path(path)
+
+        for uri in dirty_documents:
+            document = documents.get(uri)
+            if document is None:
+                continue
+            occurrences = find_occurrences(document.lines, self._cite_config)
+            with self._lock:
+                old = self._get_occurrences(uri)
+                self._open[uri] = occurrences
+                self._update_keys(uri, old)
+
+    def _scan_path(self, path: str):
+        uri = Path(path).as_uri()
+        occurrences: Occurrences = {}
+        try:
+            if os.path.getsize(path) <= MAX_INDEXED_FILE_SIZE:
+                with open(path, "r", errors="replace") as f:
+                    occurrences = find_occurrences(f.readlines(), self._cite_config)
+        except OSError:
+            # Deleted or unreadable
+            pass
+
+        with self._lock:
+            old = self._get_occurrences(uri)
+            if occurrences:
+                self._disk[uri] = occurrences
+            else:
+                self._disk.pop(uri, None)
+            self._update_keys(uri, old)
+
+    def _get_occurrences(self, uri: str) -> Occurrences:
+        if uri in self._open:
+            return self._open[uri]
+        return self._disk.get(uri, {})
+
+    def _update_keys(self, uri: str, old: Occurrences):
+        """Update the key index after the occurrences of `uri` changed from
+        `old`. Must be called with the lock held."""
+        new = self._get_occurrences(uri)
+        for key in old.keys() - new.keys():
+            uris_citing = self._keys[key]
+            uris_citing.discard(uri)
+            if not uris_citing:
+                del self._keys[key]
+
+        for key in new.keys() - old.keys():
+            self._keys.setdefault(key, set()).add(uri)
@@ -3,8 +3,6 @@ import logging
 import sys
 from pathlib import Path
 
-import tosholi
-
 file = Path(__file__).resolve()
 parent, root = file.parent, file.parents[1]
 sys.path.append(str(root))
@@ -14,8 +12,6 @@ try:
 except ValueError:
     pass
 
-from bibli_ls.bibli_config import BibliTomlConfig
-from bibli_ls.server import SERVER
 from bibli_ls import __version__
 
 
@@ -94,6 +90,10 @@ Notes:
         return
 
     if args.default_config:
+        import tosholi
+
+        from bibli_ls.bibli_config import BibliTomlConfig
+
         default_config = BibliTomlConfig()
         print(tosholi.dumps(default_config))  # type: ignore
         return
@@ -118,6 +118,9 @@ Notes:
     else:
         logging.basicConfig(stream=sys.stderr, level=log_level)
 
+    # The server pulls in pygls and the LSP types, only load them to serve
+    from bibli_ls.server import SERVER
+
     if args.tcp:
         SERVER.start_tcp(host=args.host, port=args.port)
     elif args.ws:
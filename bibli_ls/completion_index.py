@@ -0,0 +1,94 @@
+import bisect
+import re
+
+import attrs
+from lsprotocol import types
+
+"""Upper bound of the sorted citekeys sharing a prefix"""
+_MAX_CHAR = "\U0010ffff"
+
+
+class CompletionIndex:
+    """Rank completion items against the citekey being typed.
+
+    Matches are ranked, best first:
+
+    1. citekeys starting with the query, found by bisecting the sorted keys
+    2. citekeys containing the query
+    3. authors and titles containing every word of the query
+    4. citekeys containing the characters of the query in order
+
+    Lower tiers are only searched when the higher ones do not fill the limit.
+    """
+
+    _items: list[types.CompletionItem]
+    _keys: list[str]
+    _texts: list[str]
+    _sorted_keys: list[str]
+    _sorted_ids: list[int]
+
+    def __init__(
+        self, items: list[types.CompletionItem], keys: list[str], texts: list[str]
+    ):
+        """`keys` and `texts` are the citekey and the author and title of each
+        item."""
+        self._items = items
+        self._keys = [k.lower() for k in keys]
+        self._texts = [t.lower() for t in texts]
+        self._sorted_ids = sorted(range(len(keys)), key=self._keys.__getitem__)
+        self._sorted_keys = [self._keys[i] for i in self._sorted_ids]
+
+    def __len__(self):
+        return len(self._items)
+
+    def search(self, query: str, limit: int) -> list[types.CompletionItem]:
+        """The best `limit` items matching `query`, all of them if 0."""
+        limit = limit or len(self._items)
+        query = query.lower()
+        if not query:
+            ids = range(min(limit, len(self._items)))
+            return self._ranked(dict.fromkeys(ids), query)
+
+        found: dict[int, None] = {}
+
+        def add(ids):
+            for i in ids:
+                found.setdefault(i)
+                if len(found) >= limit:
+                    return True
+            return False
+
+        lo = bisect.bisect_left(self._sorted_keys, query)
+        hi = bisect.bisect_left(self._sorted_keys, query + _MAX_CHAR, lo)
+        if add(self._sorted_ids[lo:hi]):
+            return self._ranked(found, query)
+
+        if add(i for i, key in enumerate(self._keys) if query in key):
+            return self._ranked(found, query)
+
+        words = query.split()
+        if add(
+            i for i, text in enumerate(self._texts) if all(w in text for w in words)
+        ):
+            return self._ranked(found, query)
+
+        fuzzy = re.compile(".*?".join(re.escape(c) for c in query))
+        add(i for i, key in enumerate(self._keys) if fuzzy.search(key))
+        return self._ranked(found, query)
+
+    def _ranked(
+        self, found: dict[int, None], query: str
+    ) -> list[types.CompletionItem]:
+        ranked = []
+        for rank, i in enumerate(found):
+            item = self._items[i]
+            # Clients sort and filter items again, keep the server side ranking
+            # and do not let them drop items not starting with the query.
+            filter_text = None
+            if not self._keys[i].startswith(query):
+                trigger = item.label[: len(item.label) - len(self._keys[i])]
+                filter_text = trigger + query
+            ranked.append(
+                attrs.evolve(item, sort_text=f"{rank:05d}", filter_text=filter_text)
+            )
+        return ranked
@@ -1,30 +1,270 @@
+import sys
 from pathlib import Path
-from typing import Union
+from typing import Any, Iterator, Union
 
-from bibtexparser.library import Library
-from bibtexparser.model import Block, Entry
+from bibtexparser.model import Block, Entry, Field
 from typing_extensions import List
 
+"""Parser metadata holding the `(line, start column, end column)` of an entry's key"""
+KEY_SPAN = "bibli_key_span"
+
+# Fields stored in one column per library rather than in each entry, as most
+# entries have them
+COMMON_FIELDS = (
+    "author",
+    "title",
+    "year",
+    "date",
+    "journal",
+    "booktitle",
+    "publisher",
+    "volume",
+    "number",
+    "pages",
+    "doi",
+    "url",
+    "abstract",
+)
+
+COMMON_FIELD_INDEX = {name: i for i, name in enumerate(COMMON_FIELDS)}
+
+
+class FieldLayout:
+    """Names of the fields of an entry, in order, shared by all entries of a
+    library with the same fields."""
+
+    __slots__ = ("names", "extra_index")
+
+    names: tuple[str, ...]
+
+    extra_index: dict[str, int]
+    """Position of the values of the uncommon fields in `BibliEntry.extra`"""
+
+    def __init__(self, names: tuple[str, ...]):
+        self.names = names
+        extra = [n for n in names if n not in COMMON_FIELD_INDEX]
+        self.extra_index = {n: i for i, n in enumerate(extra)}
+
+
+class BibliEntry:
+    """Compact record of a parsed entry.
+
+    Only the key, type and field values are kept, without the raw source and
+    parser metadata of bibtexparser's `Entry`. Values of `COMMON_FIELDS` live
+    in the columns of the library, the others in `extra`.
+    """
+
+    __slots__ = (
+        "key",
+        "entry_type",
+        "key_span",
+        "layout",
+        "extra",
+        "row",
+        "columns",
+    )
+
+    key: str
+    entry_type: str
+
+    key_span: tuple[int, int, int] | None
+    """`(line, start column, end column)` of the key in the bibfile, if known"""
+
+    layout: FieldLayout
+    extra: tuple[Any, ...]
+
+    row: int
+    """Row of the entry in `columns`"""
+
+    columns: list[list[Any]]
+
+    def __init__(
+        self,
+        key: str,
+        entry_type: str,
+        fields: list[tuple[str, Any]],
+        key_span: tuple[int, int, int] | None = None,
+        columns: list[list[Any]] | None = None,
+        layouts: dict[tuple[str, ...], FieldLayout] | None = None,
+    ):
+        """`columns` and `layouts` are shared by the entries of a library. An
+        entry outside of any library gets its own."""
+        if columns is None:
+            columns = [[] for _ in COMMON_FIELDS]
+        if layouts is None:
+            layouts = {}
+
+        self.key = key
+        self.entry_type = sys.intern(entry_type)
+        self.key_span = key_span
+
+        names = tuple(sys.intern(name) for name, _ in fields)
+        layout = layouts.get(names)
+        if layout is None:
+            layout = layouts[names] = FieldLayout(names)
+        self.layout = layout
+
+        self.row = len(columns[0])
+        self.columns = columns
+        for column in columns:
+            column.append(None)
+        extra = []
+        for name, value in fields:
+            i = COMMON_FIELD_INDEX.get(name)
+            if i is None:
+                extra.append(value)
+            else:
+                columns[i][self.row] = value
+        self.extra = tuple(extra)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Value of field `name`, `default` if the entry does not have it."""
+        i = COMMON_FIELD_INDEX.get(name)
+        if i is not None:
+            value = self.columns[i][self.row]
+            return default if value is None else value
+        i = self.layout.extra_index.get(name)
+        return default if i is None else self.extra[i]
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        """Names and values of the fields, in the order they were parsed."""
+        extra = iter(self.extra)
+        for name in self.layout.names:
+            i = COMMON_FIELD_INDEX.get(name)
+            yield name, next(extra) if i is None else self.columns[i][self.row]
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __getitem__(self, name: str) -> Any:
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    @property
+    def fields(self) -> list[Field]:
+        """Fields as bibtexparser `Field`s, built on every access."""
+        return [Field(name, value) for name, value in self.items()]
+
+    @property
+    def fields_dict(self) -> dict[str, Field]:
+        return {f.key: f for f in self.fields}
+
+
+class BibliLibrary:
+    """Entries of a bibfile, as compact `BibliEntry` records. The parsed
+    blocks are not kept."""
 
-class BibliLibrary(Library):
     path: Path | None
 
+    generation: int
+    """Database generation this library was added in"""
+
+    display_fields: dict[str, dict[str, Any]]
+    """Field values of each entry cleaned up for display, filled lazily"""
+
+    entries_dict: dict[str, BibliEntry]
+    """Entries by key. A key defined several times keeps its first entry."""
+
+    columns: list[list[Any]]
+    """Values of each of `COMMON_FIELDS`, one row per entry, None if the entry
+    does not have the field"""
+
+    store_id: int | None
+    """Row of the library in a `SQLiteStore`, None if it is not stored"""
+
     def __init__(self, blocks: Union[List[Block], None] = None, path=None):
-        super().__init__(blocks)
         self.path = path
+        self.generation = 0
+        self.store_id = None
+        self.display_fields = {}
+        self.entries_dict = {}
+        self.columns = [[] for _ in COMMON_FIELDS]
+
+        layouts: dict[tuple[str, ...], FieldLayout] = {}
+        for block in blocks or []:
+            if isinstance(block, Entry) and block.key not in self.entries_dict:
+                entry = BibliEntry(
+                    block.key,
+                    block.entry_type,
+                    [(f.key, f.value) for f in block.fields],
+                    block.get_parser_metadata(KEY_SPAN),
+                    self.columns,
+                    layouts,
+                )
+                self.entries_dict[block.key] = entry
+
+    @property
+    def entries(self) -> list[BibliEntry]:
+        return list(self.entries_dict.values())
 
 
 class BibliBibDatabase:
     libraries: dict[str, list[BibliLibrary]]
+    """Libraries of each backend, in the order the backends are configured"""
+
+    index: dict[str, tuple[BibliEntry, BibliLibrary]]
+    """Merged citekey index. The first backend/library defining a key wins."""
+
+    shadowed: dict[str, list[tuple[BibliEntry, BibliLibrary]]]
+    """Entries hidden by an earlier definition of the same citekey"""
+
+    generation: int
+    """Bumped every time libraries change. Structures derived from the
+    libraries are stale when built at an older generation."""
+
+    generations: dict[str, int]
+    """Generation at which the libraries of each backend last changed"""
 
     def __init__(self) -> None:
         self.libraries = {}
+        self.index = {}
+        self.shadowed = {}
+        self.generation = 0
+        self.generations = {}
 
-    def find_in_libraries(
-        self, key: str
-    ) -> tuple[Entry, BibliLibrary] | tuple[None, None]:
+    def set_libraries(self, backend: str, libraries: list[BibliLibrary]):
+        """Replace the libraries of a backend and refresh the citekey index.
+
+        A reloaded backend keeps its original position, so precedence between
+        backends does not change across reloads.
+        """
+        generation = self.generation + 1
+        previous = self.libraries.get(backend, [])
+        for lib in libraries:
+            if not any(lib is p for p in previous):
+                lib.generation = generation
+
+        self.libraries[backend] = libraries
+        self.generations[backend] = generation
+        self.rebuild_index()
+        # Published last, so that readers of a new generation see its index
+        self.generation = generation
+
+    def rebuild_index(self):
+        index = {}
+        shadowed = {}
         for libs in self.libraries.values():
             for lib in libs:
-                if lib.entries_dict.__contains__(key):
-                    return lib.entries_dict[key], lib
-        return None, None
+                for key, entry in lib.entries_dict.items():
+                    if key in index:
+                        shadowed.setdefault(key, []).append((entry, lib))
+                    else:
+                        index[key] = (entry, lib)
+
+        # Swap in the new index at once so concurrent readers never see a
+        # partially built one.
+        self.index, self.shadowed = index, shadowed
+
+    def find_in_libraries(
+        self, key: str
+    ) -> tuple[BibliEntry, BibliLibrary] | tuple[None, None]:
+        return self.index.get(key, (None, None))
+
+    def search(
+        self, query: str, limit: int
+    ) -> list[tuple[BibliEntry, BibliLibrary]] | None:
+        """Entries to complete `query` with, at most `limit` of them. None when
+        all entries are in memory, to be searched with a `CompletionIndex`."""
+        return None
@@ -0,0 +1,91 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from .bibli_config import DocFormatingConfig
+from .database import BibliEntry, BibliLibrary
+from .utils import build_display_fields, build_doc_string
+
+logger = logging.getLogger(__name__)
+
+"""Default number of rendered documentation strings kept"""
+DEFAULT_DOC_CACHE_SIZE = 1024
+
+
+def get_display_fields(
+    key: str, entry: BibliEntry, library: BibliLibrary
+) -> dict[str, Any]:
+    """Display fields of an entry, computed once per library. A reloaded
+    library is a new object, so they are recomputed for each generation."""
+    display_fields = library.display_fields.get(key)
+    if display_fields is None:
+        display_fields = library.display_fields[key] = build_display_fields(entry)
+    return display_fields
+
+
+class LRUCache:
+    """Bounded mapping dropping the least recently used values first."""
+
+    maxsize: int
+    hits: int
+    misses: int
+    _values: OrderedDict
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], str]) -> str:
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                self._values.move_to_end(key)
+                return self._values[key]
+            self.misses += 1
+
+        # Rendered outside of the lock, a concurrent miss renders twice at worst
+        value = compute()
+
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class DocStringCache(LRUCache):
+    """Rendered documentation of entries, keyed by citekey, the library the
+    entry comes from and its generation, and the formatting config."""
+
+    def __init__(self, maxsize: int = DEFAULT_DOC_CACHE_SIZE):
+        super().__init__(maxsize)
+
+    def get(
+        self,
+        key: str,
+        entry: BibliEntry,
+        library: BibliLibrary,
+        config: DocFormatingConfig,
+    ) -> str:
+        bibfile = str(library.path)
+        cache_key = (key, bibfile, library.generation, repr(config))
+        doc_string = self.get_or_compute(
+            cache_key,
+            lambda: build_doc_string(
+                entry, config, bibfile, get_display_fields(key, entry, library)
+            ),
+        )
+        logger.debug(f"Documentation cache: {self.hits} hits, {self.misses} misses")
+        return doc_string
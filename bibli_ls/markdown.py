@@ -0,0 +1,207 @@
+import re
+import string
+import unicodedata
+from dataclasses import dataclass
+from typing import Any
+
+"""Characters which mdformat escapes or parses as markup in text"""
+MARKUP_CHARACTERS = frozenset("\\`*<[]")
+
+"""Character references, which mdformat escapes"""
+ENTITY_PATTERN = re.compile(r"&(#\d+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);")
+
+"""Words which mdformat escapes at the start of a paragraph line"""
+LINE_START_PATTERN = re.compile(r"[#\-+*>=~`|]|\d+[.)]")
+
+"""ATX heading line"""
+HEADING_PATTERN = re.compile(r" {0,3}(#{1,6})(?:[ \t]+(.*?))?[ \t]*$")
+
+
+class NotNative(Exception):
+    """The text needs a full markdown formatter."""
+
+
+def _is_space(c: str) -> bool:
+    return c in string.whitespace or unicodedata.category(c) == "Zs"
+
+
+def _is_punctuation(c: str) -> bool:
+    return c in string.punctuation or unicodedata.category(c).startswith("P")
+
+
+def check_text(text: str) -> str:
+    """Return `text` if mdformat leaves it unchanged as a text node, ignoring
+    whitespace. Raise NotNative otherwise."""
+    if not MARKUP_CHARACTERS.isdisjoint(text):
+        raise NotNative()
+    if "&" in text and ENTITY_PATTERN.search(text):
+        raise NotNative()
+
+    # Only underscores within words are left unescaped
+    start = text.find("_")
+    while start >= 0:
+        if start == 0 or start == len(text) - 1:
+            raise NotNative()
+        for c in (text[start - 1], text[start + 1]):
+            if _is_space(c) or _is_punctuation(c):
+                raise NotNative()
+        start = text.find("_", start + 1)
+    return text
+
+
+def wrap_words(
+    words: list[str], width: int, first_prefix: str, prefix: str
+) -> list[str]:
+    """Fill lines of at most `width` characters with `words`, like the
+    `textwrap` based wrapping of mdformat. Words longer than a line get a
+    line of their own."""
+    lines = []
+    line = first_prefix
+    line_words = 0
+    for word in words:
+        if line_words and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line, line_words = prefix, 0
+
+        # The first word of a list item does not start a paragraph line
+        starts_line = not line_words and (lines or not first_prefix)
+        if starts_line and LINE_START_PATTERN.match(word):
+            # mdformat escapes it not to start a block
+            raise NotNative()
+
+        line += (" " if line_words else "") + word
+        line_words += 1
+    lines.append(line)
+    return lines
+
+
+@dataclass
+class HeaderField:
+    name: str
+
+    glued: bool
+    """Directly next to the markup of the format, e.g. `_{author}_`"""
+
+    in_code: bool
+    """Within a code span of the format"""
+
+
+@dataclass
+class HeaderFormat:
+    """Fields of a header format which renders the same natively and with
+    mdformat, as long as the values inserted in it are plain text."""
+
+    fields: list[HeaderField]
+
+
+"""Analyzed header formats, None if they need mdformat"""
+_HEADER_FORMATS: dict[tuple[str, int], HeaderFormat | None] = {}
+
+
+def render_header(header: str, wrap: int) -> list[str]:
+    """Render the headings and paragraphs of a formatted header."""
+    blocks = []
+    paragraph: list[str] = []
+
+    def end_paragraph():
+        if paragraph:
+            blocks.append("\n".join(wrap_words(paragraph, wrap, "", "")))
+            paragraph.clear()
+
+    for line in header.split("\n"):
+        if not line.strip():
+            end_paragraph()
+            continue
+
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            end_paragraph()
+            level, content = heading.groups()
+            if content and content.endswith("#"):
+                raise NotNative()
+            blocks.append(" ".join([level] + (content or "").split()))
+        elif line.startswith((" " * 4, "\t")):
+            raise NotNative()
+        else:
+            paragraph += line.split()
+    end_paragraph()
+    return blocks
+
+
+def get_header_format(header_format: str, wrap: int) -> HeaderFormat | None:
+    """Analyze `header_format` once, checking that its own markup renders the
+    same natively and with mdformat."""
+    cache_key = (header_format, wrap)
+    if cache_key in _HEADER_FORMATS:
+        return _HEADER_FORMATS[cache_key]
+
+    result = None
+    try:
+        parts = list(string.Formatter().parse(header_format))
+        fields = []
+        backticks = 0
+        for i, (literal, name, spec, conversion) in enumerate(parts):
+            backticks += literal.count("`")
+            if name is None:
+                continue
+            if not name.isidentifier() or spec or conversion:
+                raise NotNative()
+
+            before = literal[-1:] if literal or i == 0 else "x"
+            after = ""
+            if i + 1 < len(parts):
+                after = parts[i + 1][0][:1] or "x"
+            glued = any(c and not _is_space(c) for c in (before, after))
+            fields.append(HeaderField(name, glued, backticks % 2 == 1))
+
+        import mdformat
+
+        header = header_format.format(**{f.name: "x" for f in fields})
+        native = "\n\n".join(render_header(header, wrap)) + "\n"
+        if native == mdformat.text(header, options={"wrap": wrap}):
+            result = HeaderFormat(fields)
+    except (NotNative, ValueError, IndexError, KeyError):
+        pass
+
+    _HEADER_FORMATS[cache_key] = result
+    return result
+
+
+def render_list_doc(
+    header_format: str,
+    field_dict: dict[str, Any],
+    show_field_dict: dict[str, Any],
+    wrap: int,
+) -> str | None:
+    """Render the header and field list of the `list` format exactly as
+    `mdformat.text` formats them, or None if the entry contains markup that
+    needs mdformat."""
+    header_fields = get_header_format(header_format, wrap)
+    if not header_fields:
+        return None
+
+    try:
+        values = {}
+        for field in header_fields.fields:
+            value = check_text(str(field_dict[field.name]))
+            if not value.strip() or "\n" in value:
+                raise NotNative()
+            if field.glued and not (value[0].isalnum() and value[-1].isalnum()):
+                raise NotNative()
+            if field.in_code and (value != value.strip() or " " in value):
+                raise NotNative()
+            values[field.name] = value
+        blocks = render_header(header_format.format(**values), wrap)
+
+        items = []
+        for k, v in show_field_dict.items():
+            if not k.isidentifier() or k.startswith("_") or k.endswith("_"):
+                raise NotNative()
+            words = [f"__{check_text(k)}__:"] + check_text(str(v)).split()
+            items += wrap_words(words, wrap, "- ", "  ")
+        if items:
+            blocks.append("\n".join(items))
+    except (NotNative, KeyError, ValueError, IndexError):
+        return None
+
+    return "\n\n".join(blocks) + "\n" if blocks else ""
@@ -1,6 +1,7 @@
 import re
 import logging
-from typing import List, Match
+from dataclasses import dataclass
+from typing import List
 
 from lsprotocol.types import Position
 from pygls.workspace import TextDocument
@@ -14,37 +15,161 @@ def clean_list(input: List[str]):
     return [k.strip() for k in input if k.strip()]
 
 
-def find_cites(text: str, cite_config: CiteConfig) -> List[Match[str]] | None:
-    trigger = cite_config.trigger
-    email_positions = [
-        (m.start(), m.end()) for m in re.finditer(r"\b[\w\.-]+@[\w\.-]+\.\w+\b", text)
-    ]
+"""Punctuation allowed inside a citekey, when followed by an alphanumeric"""
+CITEKEY_PUNCTUATION = ":.#$%&-+?<>~/"
 
-    # Pattern for citation keys
-    pattern = rf"{trigger}([A-Za-z0-9_-]+)"
 
-    cite_match = []
-    for match in re.finditer(pattern, text):
-        start_pos = match.start()
-        is_email = any(start <= start_pos < end for start, end in email_positions)
+@dataclass
+class Cite:
+    """A citation of `key` spanning `text[start:end]`, from the trigger to the
+    end of the key."""
 
-        if not is_email:
-            cite_match.append(match)
-    return cite_match
+    key: str
+    start: int
+    end: int
+    suppress_author: bool = False
+    """Cited as `-@key`"""
+
+    bracketed: bool = False
+    """Part of a `[...]` citation block"""
+
+    prefix: str = ""
+    """Text before the key within its citation, e.g. `see` in `[see @key]`"""
+
+    locator: str = ""
+    """Text after the key within its citation, e.g. `p. 33` in `[@key, p. 33]`"""
+
+
+class CiteTokenizer:
+    """Single pass scanner of the pandoc citation syntax.
+
+    Finds both citation blocks (`[see -@doe99, p. 33; @smith04]`) and in-text
+    citations (`@doe99 [p. 33]`). A trigger preceded by a word character, as
+    in an email address, does not start a citation.
+    """
+
+    def __init__(self, cite_config: CiteConfig):
+        trigger, prefix, postfix, separator = (
+            re.escape(c)
+            for c in (
+                cite_config.trigger,
+                cite_config.prefix,
+                cite_config.postfix,
+                cite_config.separator,
+            )
+        )
+        self._trigger = cite_config.trigger
+        punctuation = re.escape(CITEKEY_PUNCTUATION)
+        self._pattern = re.compile(
+            rf"(?P<open>{prefix})"
+            rf"|(?P<close>{postfix})"
+            rf"|(?P<separator>{separator})"
+            rf"|(?<![\w.+-])(?P<suppress>-)?(?P<trigger>{trigger})"
+            rf"(?:\{{(?P<braced>[^{{}}]*)\}}|(?P<key>\w(?:\w|[{punctuation}](?=\w))*))"
+        )
+
+    def tokenize(self, text: str) -> list[Cite]:
+        cites: list[Cite] = []
+        if self._trigger not in text:
+            return cites
+
+        # Cites of the currently open block, None outside of a block
+        block: list[Cite] | None = None
+        block_open = 0
+        segment_start = 0
+        # Last cite of the current block, or the last in-text cite
+        last: Cite | None = None
+        in_text: Cite | None = None
+
+        for match in self._pattern.finditer(text):
+            if match.group("open") is not None:
+                block, block_open = [], match.start()
+                segment_start, in_text, last = match.end(), last, None
+
+            elif match.group("trigger") is not None:
+                key = match.group("key")
+                if key is None:
+                    key = match.group("braced")
+                cite = Cite(
+                    key,
+                    match.start("trigger"),
+                    match.end(),
+                    suppress_author=match.group("suppress") is not None,
+                )
+                if block is not None:
+                    cite.prefix = text[segment_start : match.start()].strip()
+                    block.append(cite)
+                cites.append(cite)
+                last = cite
+
+            elif block is None:
+                continue
+
+            elif match.group("separator") is not None:
+                if last:
+                    last.locator = text[last.end : match.start()].strip(" ,")
+                segment_start, last = match.end(), None
+
+            else:  # Closing a block
+                if block:
+                    if last:
+                        last.locator = text[last.end : match.start()].strip(" ,")
+                    for cite in block:
+                        cite.bracketed = True
+                elif in_text and not text[in_text.end : block_open].strip():
+                    # `@key [p. 33]`
+                    in_text.locator = text[segment_start : match.start()].strip()
+                block, last, in_text = None, None, None
+
+        return cites
+
+
+_TOKENIZERS: dict[tuple[str, str, str, str], CiteTokenizer] = {}
+
+
+def get_tokenizer(cite_config: CiteConfig) -> CiteTokenizer:
+    """Tokenizer of `cite_config`, compiled once."""
+    config_key = (
+        cite_config.trigger,
+        cite_config.prefix,
+        cite_config.postfix,
+        cite_config.separator,
+    )
+    tokenizer = _TOKENIZERS.get(config_key)
+    if tokenizer is None:
+        tokenizer = _TOKENIZERS[config_key] = CiteTokenizer(cite_config)
+    return tokenizer
+
+
+def find_cites(text: str, cite_config: CiteConfig) -> list[Cite]:
+    return get_tokenizer(cite_config).tokenize(text)
 
 
 def citekey_at_position(
     doc: TextDocument, position: Position, cite_config: CiteConfig
 ) -> str | None:
     line = doc.lines[position.line]
-    cite_matches = find_cites(line, cite_config)
-    if not cite_matches:
-        return None
-
-    for match in cite_matches:
-        key = match.group(1)
-        if position.character >= match.start() and position.character < match.end():
-            logger.debug(f"Returning {key}")
-            return key
+    for cite in find_cites(line, cite_config):
+        if cite.start <= position.character < cite.end:
+            logger.debug(f"Returning {cite.key}")
+            return cite.key
 
     return None
+
+
+def cite_prefix_at_position(
+    line: str, character: int, cite_config: CiteConfig
+) -> str:
+    """The part of a citekey typed before `character`, empty if none."""
+    before = line[:character]
+    trigger = before.rfind(cite_config.trigger)
+    if trigger < 0:
+        return ""
+
+    prefix = before[trigger + len(cite_config.trigger) :]
+    if any(
+        c.isspace() or c in (cite_config.separator, cite_config.postfix)
+        for c in prefix
+    ):
+        return ""
+    return prefix.lstrip("{")
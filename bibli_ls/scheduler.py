@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor
+from typing import Callable, Sequence
+
+from lsprotocol import types
+from pygls.workspace import TextDocument
+
+from .bibli_config import DEFAULT_DIAGNOSTIC_DELAY
+
+logger = logging.getLogger(__name__)
+
+Changes = Sequence[types.TextDocumentContentChangeEvent]
+
+
+class DiagnosticsScheduler:
+    """Debounce and coalesce the diagnostics of each document.
+
+    Changes arriving within `delay` seconds of each other are diagnosed
+    together, in `executor` rather than on the event loop. At most one
+    diagnosis runs per document at a time, and diagnostics are only published
+    if the document was not changed again in the meantime.
+
+    `diagnose` is called with a snapshot of the document and either all the
+    changes since the previous call, or None for a full diagnosis.
+    """
+
+    delay: float
+    _loop: asyncio.AbstractEventLoop | None
+    _timers: dict[str, asyncio.TimerHandle]
+    _changes: dict[str, list[types.TextDocumentContentChangeEvent] | None]
+    _running: set[str]
+
+    def __init__(
+        self,
+        get_document: Callable[[str], TextDocument | None],
+        diagnose: Callable[[TextDocument, Changes | None], None],
+        publish: Callable[[str], None],
+        executor: Callable[[], Executor],
+        delay: float = DEFAULT_DIAGNOSTIC_DELAY,
+    ):
+        self._get_document = get_document
+        self._diagnose = diagnose
+        self._publish = publish
+        self._executor = executor
+        self.delay = delay
+        self._loop = None
+        self._timers = {}
+        self._changes = {}
+        self._running = set()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Set the event loop the scheduler runs on."""
+        self._loop = loop
+
+    def schedule(
+        self, uri: str, changes: Changes | None = None, delay: float | None = None
+    ):
+        """Schedule diagnosing `uri` after `changes`, or fully if None.
+
+        Can be called from any thread.
+        """
+        if self._loop is None:
+            return
+
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+
+        # Changes must be recorded before any pending diagnosis of the already
+        # changed document starts, so do not defer when already on the loop.
+        if on_loop:
+            self._schedule(uri, changes, delay)
+        else:
+            self._loop.call_soon_threadsafe(self._schedule, uri, changes, delay)
+
+    def cancel(self, uri: str):
+        """Drop any pending diagnosis of `uri`."""
+        timer = self._timers.pop(uri, None)
+        if timer:
+            timer.cancel()
+        self._changes.pop(uri, None)
+
+    def _schedule(self, uri: str, changes: Changes | None, delay: float | None):
+        if changes is None or (uri in self._changes and self._changes[uri] is None):
+            self._changes[uri] = None
+        else:
+            self._changes.setdefault(uri, []).extend(changes)  # type: ignore
+
+        timer = self._timers.pop(uri, None)
+        if timer:
+            timer.cancel()
+
+        assert self._loop
+        self._timers[uri] = self._loop.call_later(
+            self.delay if delay is None else delay, self._run, uri
+        )
+
+    def _run(self, uri: str):
+        self._timers.pop(uri, None)
+        if uri in self._running or uri not in self._changes:
+            # Picked up again once the running diagnosis is done
+            return
+
+        changes = self._changes.pop(uri)
+        document = self._get_document(uri)
+        if document is None:
+            return
+
+        # The document keeps changing on the loop while being diagnosed
+        snapshot = TextDocument(uri, document.source, version=document.version)
+
+        assert self._loop
+        self._running.add(uri)
+        future = self._loop.run_in_executor(
+            self._executor(), self._diagnose, snapshot, changes
+        )
+        future.add_done_callback(functools.partial(self._done, uri, snapshot.version))
+
+    def _done(self, uri: str, version: int | None, future: asyncio.Future):
+        self._running.discard(uri)
+
+        if future.exception():
+            logger.error(f"Failed to diagnose `{uri}`: {future.exception()}")
+        else:
+            document = self._get_document(uri)
+            if document is not None and document.version == version:
+                self._publish(uri)
+
+        if uri in self._changes and uri not in self._timers:
+            self._run(uri)
@@ -1,32 +1,62 @@
+import asyncio
 import logging
 import os
+import threading
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Sequence
 
+import attrs
 from lsprotocol import types
+from pygls import uris
 from pygls.lsp.server import LanguageServer
+from pygls.progress import Progress
 from pygls.protocol.language_server import LanguageServerProtocol, lsp_method
 from pygls.workspace.text_document import TextDocument
 
+from bibli_ls.backends.backend import BibliBackend
 from bibli_ls.backends.bibtex_backend import BibfileBackend
-from bibli_ls.backends.zotero_backend import ZoteroBackend
+from bibli_ls.backends.bibtex_splitter import find_key_span
 
 from . import __version__
-from .bibli_config import BibliTomlConfig
-from .database import BibliBibDatabase
+from .better_bibtex import BetterBibTeXClient
+from .bibli_config import BackendConfig, BibliTomlConfig
+from .database import BibliBibDatabase, BibliEntry, BibliLibrary
+from .doc_cache import DocStringCache
 from .utils import (
-    build_doc_string,
+    build_entry_detail,
     get_cite_uri,
     get_note_uri,
     show_message,
 )
-from .parse import citekey_at_position, find_cites
+from .cite_index import CiteIndex
+from .completion_index import CompletionIndex
+from .parse import cite_prefix_at_position, citekey_at_position, find_cites
+from .scheduler import DiagnosticsScheduler
+from .watcher import BibfileWatcher, WorkspaceWatcher
+
+if TYPE_CHECKING:
+    from bibli_ls.backends.zotero_backend import ZoteroBackend
 
 logger = logging.getLogger(__name__)
 
 CONFIG = BibliTomlConfig()
 CONFIG_FILE: Path
 DATABASE = BibliBibDatabase()
+DOC_CACHE = DocStringCache()
+BBT_CLIENT = BetterBibTeXClient()
+NO_DIAGNOSTICS: list[types.Diagnostic] = []
+BACKENDS: dict[str, BibliBackend] = {}
+WATCHER: BibfileWatcher | None = None
+WORKSPACE_WATCHER: WorkspaceWatcher | None = None
+
+"""Work done progress token of loading the libraries of all backends"""
+LOAD_PROGRESS_TOKEN = "bibli/load_libraries"
+
+"""Serializes loading libraries, e.g. a reload requested during startup"""
+LOAD_LOCK = threading.Lock()
+
+"""A completion item with its citekey and the text searched for it"""
+CompletionEntry = tuple[str, types.CompletionItem, str]
 
 
 def try_load_configs_file(ls: LanguageServer, root_path=None, config_file=None):
@@ -62,27 +92,193 @@ def try_load_configs_file(ls: LanguageServer, root_path=None, config_file=None):
         logger.error("Invalid config")
 
 
-def load_libraries(ls: LanguageServer, use_cached: bool = True):
-    global DATABASE, CONFIG
-    for k, v in CONFIG.backends.items():
+def open_database(ls: LanguageServer, root_path: str | None):
+    """Switch to the storage engine of the config. Libraries stored by the
+    previous session are available right away."""
+    global DATABASE
+
+    if CONFIG.storage.engine != "sqlite":
+        return
+
+    # sqlite3 is only needed with the SQLite store
+    from .sqlite_store import SQLiteBibDatabase
+
+    path = CONFIG.storage.path
+    if not os.path.isabs(path) and root_path:
+        path = os.path.join(root_path, path)
+
+    try:
+        DATABASE = SQLiteBibDatabase(path, list(CONFIG.backends))
+    except Exception as e:
+        logger.exception(f"Failed to open library store `{path}`")
         show_message(
             ls,
-            f"Processing backend `{k}` type `{v.backend_type}`",
+            f"Failed to open library store `{path}`, keeping entries in memory: {e}",
+            types.MessageType.Error,
         )
-        if v.backend_type == "zotero_api":
-            if not use_cached:
-                DATABASE.libraries[k] = ZoteroBackend(k, v, ls).get_libraries()
-            else:
-                DATABASE.libraries[k] = ZoteroBackend(k, v, ls).get_libraries_cached()
+        return
 
-        elif v.backend_type == "bibfile":
-            DATABASE.libraries[k] = BibfileBackend(k, v, ls).get_libraries()
+    show_message(ls, f"Opened library store `{path}`")
+
+
+def load_backend(
+    ls: LanguageServer, name: str, config: BackendConfig, use_cached: bool
+):
+    """Load the libraries of a backend and publish them to the database."""
+    show_message(
+        ls,
+        f"Processing backend `{name}` type `{config.backend_type}`",
+    )
+    if config.backend_type == "zotero_api":
+        # Pulls in requests and its HTTP stack, only load it when used
+        from bibli_ls.backends.zotero_backend import ZoteroBackend
+
+        backend = ZoteroBackend(name, config, ls)
+        BACKENDS[name] = backend
+        if not use_cached:
+            DATABASE.set_libraries(name, backend.get_libraries())
         else:
+            DATABASE.set_libraries(name, backend.get_libraries_cached())
+            # Serve the cached library while checking it is still current
+            if backend.is_cache_stale():
+                ls.thread_pool.submit(revalidate_backend, ls, name, backend)
+
+    elif config.backend_type == "bibfile":
+        backend = BibfileBackend(name, config, ls)
+        BACKENDS[name] = backend
+        DATABASE.set_libraries(name, backend.get_libraries())
+    else:
+        show_message(
+            ls,
+            f"Unknown backend type {config.backend_type} ",
+            types.MessageType.Error,
+        )
+
+
+def revalidate_backend(ls: LanguageServer, name: str, backend: "ZoteroBackend"):
+    """Update the libraries of a backend loaded from its cache file, if they
+    changed since it was written."""
+    with LOAD_LOCK:
+        if BACKENDS.get(name) is not backend:
+            # Reloaded in the meantime
+            return
+
+        try:
+            libraries = backend.revalidate()
+        except Exception as e:
+            logger.exception(f"Failed to refresh backend `{name}`")
             show_message(
-                ls,
-                f"Unknown backend type {v.backend_type} ",
-                types.MessageType.Error,
+                ls, f"Failed to refresh backend `{name}`: {e}", types.MessageType.Error
             )
+            return
+
+        if libraries is None:
+            return
+        DATABASE.set_libraries(name, libraries)
+
+    if isinstance(ls, BibliLanguageServer):
+        ls.on_libraries_changed()
+
+
+def load_libraries(ls: LanguageServer, use_cached: bool = True):
+    """Load the libraries of all backends, one after the other.
+
+    Each backend is published to the database as soon as it is loaded, so
+    requests are answered from the libraries loaded so far in the meantime.
+    """
+    with LOAD_LOCK:
+        progress = Progress(ls.protocol)
+        progress.create(LOAD_PROGRESS_TOKEN)
+        progress.begin(
+            LOAD_PROGRESS_TOKEN,
+            types.WorkDoneProgressBegin(title="Loading libraries", percentage=0),
+        )
+
+        backends = list(CONFIG.backends.items())
+        try:
+            for i, (k, v) in enumerate(backends):
+                try:
+                    load_backend(ls, k, v, use_cached)
+                except Exception as e:
+                    logger.exception(f"Failed to load backend `{k}`")
+                    show_message(
+                        ls,
+                        f"Failed to load backend `{k}`: {e}",
+                        types.MessageType.Error,
+                    )
+
+                progress.report(
+                    LOAD_PROGRESS_TOKEN,
+                    types.WorkDoneProgressReport(
+                        message=f"Loaded backend `{k}`",
+                        percentage=int((i + 1) * 100 / len(backends)),
+                    ),
+                )
+                # Check open documents against the libraries loaded so far
+                if isinstance(ls, BibliLanguageServer):
+                    ls.on_libraries_changed()
+
+            watch_bibfiles(ls)
+        finally:
+            progress.end(LOAD_PROGRESS_TOKEN, types.WorkDoneProgressEnd())
+
+
+def watch_bibfiles(ls: LanguageServer):
+    """Start watching the bibfiles of all `bibfile` backends."""
+    global WATCHER
+
+    paths = []
+    for backend in BACKENDS.values():
+        if isinstance(backend, BibfileBackend) and backend._config.watch:
+            paths += backend.get_bibfile_paths()
+
+    if not WATCHER:
+        WATCHER = BibfileWatcher(lambda path: reload_bibfile(ls, path))
+    WATCHER.start(paths)
+
+
+def reload_bibfile(ls: LanguageServer, path: str):
+    """Re-parse a single bibfile that changed on disk and swap it into the
+    database, leaving all other libraries untouched."""
+    with LOAD_LOCK:
+        # Backends loaded or replaced while waiting for the lock are the
+        # current ones once it is taken
+        for k, backend in list(BACKENDS.items()):
+            if not isinstance(backend, BibfileBackend):
+                continue
+
+            libraries = backend.reload_bibfile(path, DATABASE.libraries.get(k, []))
+            if libraries is None:
+                continue
+
+            DATABASE.set_libraries(k, libraries)
+            show_message(ls, f"Reloaded bibfile `{path}`")
+
+    if isinstance(ls, BibliLanguageServer):
+        ls.on_libraries_changed()
+
+
+def index_citations(ls: "BibliLanguageServer"):
+    """Build the citation index of the workspace in the background and keep
+    it up to date with the files changed on disk."""
+    global WORKSPACE_WATCHER
+
+    ls.cite_index = CiteIndex(CONFIG.cite, CONFIG.references.file_extensions)
+
+    root_path = ls.workspace.root_path
+    if not root_path:
+        return
+
+    ls.cite_index.build_in_background(root_path)
+
+    if not WORKSPACE_WATCHER:
+        WORKSPACE_WATCHER = WorkspaceWatcher(
+            lambda path: ls.cite_index.invalidate_path(path)
+        )
+    # Watching a big workspace takes a while, do not hold up initialize
+    threading.Thread(
+        target=WORKSPACE_WATCHER.start, args=[root_path], daemon=True
+    ).start()
 
 
 class BibliLanguageServerProtocol(LanguageServerProtocol):
@@ -93,12 +289,17 @@ class BibliLanguageServerProtocol(LanguageServerProtocol):
         """Initialize LSP"""
 
         initialize_result: types.InitializeResult = super().lsp_initialize(params)
+        ls = self._server
+        assert isinstance(ls, BibliLanguageServer)
 
         if params.root_path:
-            try_load_configs_file(self._server, root_path=params.root_path)
+            try_load_configs_file(ls, root_path=params.root_path)
+        open_database(ls, params.root_path)
+
+        index_citations(ls)
 
-        # Load libraries
-        load_libraries(self._server)
+        ls.diagnostics_scheduler.delay = CONFIG.diagnostic.delay
+        ls.diagnostics_scheduler.attach(asyncio.get_running_loop())
 
         # Register additional trigger characters
         completion_provider = initialize_result.capabilities.completion_provider
@@ -111,6 +312,14 @@ class BibliLanguageServerProtocol(LanguageServerProtocol):
 
         return initialize_result
 
+    @lsp_method(types.INITIALIZED)
+    def lsp_initialized(self, *args) -> None:
+        super().lsp_initialized(*args)
+
+        # Initialize does not wait for the libraries, they load in the
+        # background with progress reported to the client
+        self._server.thread_pool.submit(load_libraries, self._server)
+
 
 class BibliLanguageServer(LanguageServer):
     """Bibli language server.
@@ -124,74 +333,264 @@ class BibliLanguageServer(LanguageServer):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         self.index = {}
         self.diagnostics = {}
+        self.line_diagnostics: dict[str, list[list[types.Diagnostic]]] = {}
+        self.published_diagnostics: dict[str, list[types.Diagnostic]] = {}
         self.completion_cache = []
+        self.completion_index = CompletionIndex([], [], [])
+        # Database generation the completion index was built at
+        self.completion_generation = -1
+        # Items of each backend, with the backend generation they were built at
+        self.completion_parts: dict[str, tuple[int, list[CompletionEntry]]] = {}
+        self.cite_index = CiteIndex(CONFIG.cite, CONFIG.references.file_extensions)
+        # Guards the per-line diagnostics state, updated from worker threads
+        self.diagnostics_lock = threading.Lock()
+        self.diagnostics_scheduler = DiagnosticsScheduler(
+            get_document=lambda uri: self.workspace.text_documents.get(uri),
+            diagnose=self.diagnose_document,
+            publish=self.publish_diagnostics,
+            executor=lambda: self.thread_pool,
+        )
 
         super().__init__(*args, **kwargs)
 
+    def on_libraries_changed(self):
+        """Re-check open documents. Caches derived from the libraries are
+        rebuilt lazily when the database generation changes."""
+        for uri in list(self.workspace.text_documents.keys()):
+            self.diagnostics_scheduler.schedule(uri, delay=0)
+
+        # Clients pulling diagnostics are asked to pull them again
+        workspace = self.client_capabilities.workspace
+        diagnostics = workspace and workspace.diagnostics
+        if diagnostics and diagnostics.refresh_support:
+            self.workspace_diagnostic_refresh(None)
+
+    def diagnose_document(
+        self,
+        document: TextDocument,
+        changes: Sequence[types.TextDocumentContentChangeEvent] | None,
+    ):
+        """Diagnose `document` after `changes`, or entirely if None."""
+        with self.diagnostics_lock:
+            if document.uri not in self.workspace.text_documents:
+                # Closed in the meantime
+                return
+
+            if changes is None:
+                self.diagnose(document)
+            else:
+                self.diagnose_changes(document, changes)
+
+    def publish_diagnostics(self, uri: str):
+        """Publish the diagnostics of `uri`, unless the client already has them."""
+        if uri not in self.diagnostics:
+            return
+
+        version, diagnostics = self.diagnostics[uri]
+        if self.published_diagnostics.get(uri) == diagnostics:
+            return
+
+        self.published_diagnostics[uri] = diagnostics
+        self.text_document_publish_diagnostics(
+            types.PublishDiagnosticsParams(
+                uri=uri, version=version, diagnostics=diagnostics
+            )
+        )
+
+    def forget_diagnostics(self, uri: str):
+        """Drop all diagnostics state of a closed document."""
+        self.diagnostics_scheduler.cancel(uri)
+        with self.diagnostics_lock:
+            self.diagnostics.pop(uri, None)
+            self.line_diagnostics.pop(uri, None)
+            self.published_diagnostics.pop(uri, None)
+
+    def get_completion_index(self) -> CompletionIndex:
+        if self.completion_generation != DATABASE.generation:
+            self.rebuild_completion_items()
+        return self.completion_index
+
+    def search_completion_items(self, query: str) -> list[types.CompletionItem]:
+        """The best completion items for the citekey prefix `query`."""
+        limit = CONFIG.completion.max_items
+        found = DATABASE.search(query, limit)
+        if found is None:
+            return self.get_completion_index().search(query, limit)
+
+        # Only the candidates of the store are built, then ranked the same way
+        # as with all entries in memory
+        completion_entries = [
+            self.build_completion_entry(entry.key, entry) for entry, _ in found
+        ]
+        return CompletionIndex(
+            [item for _, item, _ in completion_entries],
+            [k for k, _, _ in completion_entries],
+            [search_text for _, _, search_text in completion_entries],
+        ).search(query, limit)
+
+    def build_completion_entry(self, k: str, entry: BibliEntry) -> CompletionEntry:
+        key = CONFIG.cite.trigger + k
+        # Documentation is only rendered on completionItem/resolve
+        item = types.CompletionItem(
+            key,
+            insert_text=key,
+            commit_characters=[
+                CONFIG.cite.postfix,
+                CONFIG.cite.separator,
+            ],
+            additional_text_edits=[],
+            kind=types.CompletionItemKind.Reference,
+            detail=build_entry_detail(entry),
+            data={"citekey": k},
+        )
+        search_text = " ".join(str(entry[f]) for f in ["author", "title"] if f in entry)
+        return (k, item, search_text)
+
+    def build_completion_items(
+        self, libraries: list[BibliLibrary]
+    ) -> list[CompletionEntry]:
+        """Completion items of `libraries`, with their citekey and search text."""
+        processed_keys = set()
+        completion_entries = []
+        for lib in libraries:
+            for k, entry in lib.entries_dict.items():
+                # Avoid showing duplicated entries
+                if k not in processed_keys:
+                    processed_keys.add(k)
+                    completion_entries.append(self.build_completion_entry(k, entry))
+        return completion_entries
+
     def rebuild_completion_items(
         self,
     ):
-        processed_keys = {}
-        self.completion_cache.clear()
-        for libraries in DATABASE.libraries.values():
-            for lib in libraries:
-                for k, entry in lib.entries_dict.items():
-                    key = CONFIG.cite.trigger + k
-                    text_edits = []
-                    doc_string = build_doc_string(
-                        entry, CONFIG.completion.doc_format, str(lib.path)
-                    )
+        """Rebuild the completion index, only recomputing the items of the
+        backends changed since the last build."""
+        generation = DATABASE.generation
+
+        parts = {}
+        for backend, libraries in list(DATABASE.libraries.items()):
+            backend_generation = DATABASE.generations.get(backend, 0)
+            part = self.completion_parts.get(backend)
+            if part is None or part[0] != backend_generation:
+                part = (backend_generation, self.build_completion_items(libraries))
+            parts[backend] = part
+        self.completion_parts = parts
+
+        # Earlier backends win on duplicated keys
+        processed_keys = set()
+        completion_cache = []
+        citekeys = []
+        search_texts = []
+        for _, completion_entries in parts.values():
+            for k, item, search_text in completion_entries:
+                if k not in processed_keys:
+                    processed_keys.add(k)
+                    completion_cache.append(item)
+                    citekeys.append(k)
+                    search_texts.append(search_text)
+
+        self.completion_cache = completion_cache
+        self.completion_index = CompletionIndex(
+            completion_cache, citekeys, search_texts
+        )
+        self.completion_generation = generation
 
-                    # Avoid showing duplicated entries
-                    if not processed_keys.get(key):
-                        processed_keys[key] = True
-                        self.completion_cache.append(
-                            types.CompletionItem(
-                                key,
-                                insert_text=key,
-                                commit_characters=[
-                                    CONFIG.cite.postfix,
-                                    CONFIG.cite.separator,
-                                ],
-                                additional_text_edits=text_edits,
-                                kind=types.CompletionItemKind.Reference,
-                                documentation=types.MarkupContent(
-                                    kind=types.MarkupKind.Markdown,
-                                    value=doc_string,
-                                ),
-                            )
-                        )
+    def diagnose_line(self, idx: int, line: str) -> list[types.Diagnostic]:
+        cites = find_cites(line, CONFIG.cite)
+        if not cites:
+            return NO_DIAGNOSTICS
 
-    def diagnose(self, document: TextDocument):
-        global CONFIG
         diagnostics = []
+        for cite in cites:
+            key = cite.key
 
-        for idx, line in enumerate(document.lines):
-            cite_matches = find_cites(line, CONFIG.cite)
-            if not cite_matches:
+            if DATABASE.find_in_libraries(key) != (
+                None,
+                None,
+            ):
                 continue
-            for match in cite_matches:
-                key = match.group(1)
-
-                if DATABASE.find_in_libraries(key) != (
-                    None,
-                    None,
-                ):
-                    continue
-
-                message = f'Item "{key}" does not exist in library'
-                severity = types.DiagnosticSeverity.Warning
-                diagnostics.append(
-                    types.Diagnostic(
-                        message=message,
-                        severity=severity,
+
+            message = f'Item "{key}" does not exist in library'
+            severity = types.DiagnosticSeverity.Warning
+            diagnostics.append(
+                types.Diagnostic(
+                    message=message,
+                    severity=severity,
+                    range=types.Range(
+                        start=types.Position(line=idx, character=cite.start),
+                        end=types.Position(line=idx, character=cite.end),
+                    ),
+                )
+            )
+        return diagnostics or NO_DIAGNOSTICS
+
+    def diagnose(self, document: TextDocument):
+        """Diagnose the whole document."""
+        global CONFIG
+
+        line_diagnostics = [
+            self.diagnose_line(idx, line) for idx, line in enumerate(document.lines)
+        ]
+        # Position after a trailing newline, edits can start there
+        if document.source.endswith("\n") or not document.lines:
+            line_diagnostics.append(NO_DIAGNOSTICS)
+
+        self.line_diagnostics[document.uri] = line_diagnostics
+        self.store_diagnostics(document)
+
+    def diagnose_changes(
+        self,
+        document: TextDocument,
+        changes: Sequence[types.TextDocumentContentChangeEvent],
+    ):
+        """Diagnose only the lines touched by `changes`, already applied to
+        `document`, and shift the diagnostics of the lines below them."""
+        line_diagnostics = self.line_diagnostics.get(document.uri)
+        if line_diagnostics is None:
+            return self.diagnose(document)
+
+        # Replay the changes on the per-line state, leaving None for the lines
+        # to re-scan, as each change is relative to the previous one.
+        state: list[list[types.Diagnostic] | None] = list(line_diagnostics)
+        for change in changes:
+            if not isinstance(change, types.TextDocumentContentChangePartial):
+                return self.diagnose(document)
+
+            start, end = change.range.start.line, change.range.end.line
+            state[start : end + 1] = [None] * (change.text.count("\n") + 1)
+
+        if len(state) != document.source.count("\n") + 1:
+            logger.warning(f"Out of sync line state for `{document.uri}`")
+            return self.diagnose(document)
+
+        lines = document.lines
+        line_diagnostics = []
+        for idx, diagnostics in enumerate(state):
+            if diagnostics is None:
+                line = lines[idx] if idx < len(lines) else ""
+                diagnostics = self.diagnose_line(idx, line)
+            elif diagnostics and diagnostics[0].range.start.line != idx:
+                diagnostics = [
+                    attrs.evolve(
+                        diagnostic,
                         range=types.Range(
-                            start=types.Position(line=idx, character=match.start()),
-                            end=types.Position(line=idx, character=match.end()),
+                            start=types.Position(idx, diagnostic.range.start.character),
+                            end=types.Position(idx, diagnostic.range.end.character),
                         ),
                     )
-                )
-
+                    for diagnostic in diagnostics
+                ]
+            line_diagnostics.append(diagnostics)
+
+        self.line_diagnostics[document.uri] = line_diagnostics
+        self.store_diagnostics(document)
+
+    def store_diagnostics(self, document: TextDocument):
+        diagnostics = [
+            diagnostic
+            for line in self.line_diagnostics[document.uri]
+            for diagnostic in line
+        ]
         self.diagnostics[document.uri] = (document.version, diagnostics)
 
 
@@ -226,7 +625,11 @@ def code_actions(params: types.CodeActionParams):
 
 
 @SERVER.feature(types.TEXT_DOCUMENT_DID_SAVE)
-def did_save(_: BibliLanguageServer, params: types.DidSaveTextDocumentParams):
+def did_save(ls: BibliLanguageServer, params: types.DidSaveTextDocumentParams):
+    path = uris.to_fs_path(params.text_document.uri)
+    if path:
+        ls.cite_index.invalidate_path(path)
+
     if params.text_document.uri == CONFIG_FILE.as_uri():
         logger.info(f"Config file `{CONFIG_FILE}` modified")
 
@@ -234,36 +637,29 @@ def did_save(_: BibliLanguageServer, params: types.DidSaveTextDocumentParams):
 @SERVER.feature(types.TEXT_DOCUMENT_DID_OPEN)
 def did_open(ls: BibliLanguageServer, params: types.DidOpenTextDocumentParams):
     """Parse each document when it is opened"""
-    doc = ls.workspace.get_text_document(params.text_document.uri)
-    ls.diagnose(doc)
-
-    for uri, (version, diagnostics) in ls.diagnostics.items():
-        ls.text_document_publish_diagnostics(
-            types.PublishDiagnosticsParams(
-                uri=uri, version=version, diagnostics=diagnostics
-            )
-        )
+    uri = params.text_document.uri
+    ls.diagnostics_scheduler.schedule(uri, delay=0)
+    ls.cite_index.invalidate_document(uri)
 
 
 @SERVER.feature(types.TEXT_DOCUMENT_DID_CHANGE)
-def did_change(ls: BibliLanguageServer, params: types.DidOpenTextDocumentParams):
-    """Parse each document when it is changed"""
-    doc = ls.workspace.get_text_document(params.text_document.uri)
-    ls.diagnose(doc)
+def did_change(ls: BibliLanguageServer, params: types.DidChangeTextDocumentParams):
+    """Parse the changed lines of each document once the edits settle"""
+    uri = params.text_document.uri
+    ls.diagnostics_scheduler.schedule(uri, params.content_changes)
+    ls.cite_index.invalidate_document(uri)
 
-    for uri, (version, diagnostics) in ls.diagnostics.items():
-        ls.text_document_publish_diagnostics(
-            types.PublishDiagnosticsParams(
-                uri=uri, version=version, diagnostics=diagnostics
-            )
-        )
+
+@SERVER.feature(types.TEXT_DOCUMENT_DID_CLOSE)
+def did_close(ls: BibliLanguageServer, params: types.DidCloseTextDocumentParams):
+    ls.forget_diagnostics(params.text_document.uri)
+    ls.cite_index.close_document(params.text_document.uri)
 
 
+@SERVER.thread()
 @SERVER.feature(types.TEXT_DOCUMENT_REFERENCES)
 def find_references(ls: BibliLanguageServer, params: types.ReferenceParams):
-    """textDocument/references: Find references of an object through simple ripgrep."""
-
-    from ripgrepy import Ripgrepy
+    """textDocument/references: Find the citations of an entry in the workspace."""
 
     root_path = ls.workspace.root_path
     if not root_path:
@@ -275,34 +671,7 @@ def find_references(ls: BibliLanguageServer, params: types.ReferenceParams):
     if not cite:
         return
 
-    # Include trigger for better accuracy
-    rg = Ripgrepy(CONFIG.cite.trigger + cite, root_path)
-    result = rg.with_filename().json().run().as_dict
-    references = []
-
-    for res in result:
-        if res["type"] == "match":
-            # for submatch in res["data"]["submatches"]:
-            submatch = res["data"]["submatches"][0]
-            file_uri = "file://" + res["data"]["path"]["text"]
-            line_no = res["data"]["line_number"]
-            references.append(
-                types.Location(
-                    uri=file_uri,
-                    range=types.Range(
-                        start=types.Position(
-                            line=line_no - 1,
-                            character=submatch["start"],
-                        ),
-                        end=types.Position(
-                            line=line_no - 1, character=submatch["end"] - 1
-                        ),
-                    ),
-                )
-            )
-
-    # logger.debug(f"RESULTS: {references}")
-    return references
+    return ls.cite_index.find(cite, ls.workspace.text_documents)
 
 
 @SERVER.feature(types.TEXT_DOCUMENT_DEFINITION)
@@ -319,31 +688,27 @@ def goto_definition(ls: BibliLanguageServer, params: types.DefinitionParams):
 
     (entry, library) = DATABASE.find_in_libraries(cite)
     if entry and library and library.path is not None:
-        from ripgrepy import Ripgrepy
-
-        rg = Ripgrepy(cite, str(library.path))
-        result = rg.with_filename().json().run().as_dict
-        for res in result:
-            if res["type"] == "match":
-                submatch = res["data"]["submatches"][0]
-                line_no = res["data"]["line_number"]
-                definitions.append(
-                    types.Location(
-                        uri=Path(library.path).as_uri(),
-                        range=types.Range(
-                            start=types.Position(
-                                line=line_no - 1, character=submatch["start"]
-                            ),
-                            end=types.Position(
-                                line=line_no - 1, character=submatch["end"] - 1
-                            ),
-                        ),
-                    )
+        span = entry.key_span
+        if not span and os.path.exists(library.path):
+            span = find_key_span(str(library.path), cite)
+
+        if span:
+            line_no, start, end = span
+            definitions.append(
+                types.Location(
+                    uri=Path(library.path).as_uri(),
+                    range=types.Range(
+                        start=types.Position(line=line_no, character=start),
+                        end=types.Position(line=line_no, character=end - 1),
+                    ),
                 )
+            )
     # logger.debug(f"Founr definitions: {definitions}")
     return definitions
 
 
+# Looking up attachments in Zotero must not block other requests
+@SERVER.thread()
 @SERVER.feature(types.TEXT_DOCUMENT_IMPLEMENTATION)
 def goto_implementation(ls: BibliLanguageServer, params: types.DefinitionParams):
     """textDocument/definition: Jump to an object's type definition."""
@@ -353,7 +718,10 @@ def goto_implementation(ls: BibliLanguageServer, params: types.DefinitionParams)
     if not cite:
         return
 
-    uri = get_cite_uri(DATABASE, cite, CONFIG)
+    # Neighbouring cites are likely to be opened next
+    line = document.lines[params.position.line]
+    prefetch = [c.key for c in find_cites(line, CONFIG.cite) if c.key != cite]
+    uri = get_cite_uri(DATABASE, cite, CONFIG, BBT_CLIENT, prefetch)
     if uri:
         ls.window_show_document(types.ShowDocumentParams(uri, external=True))
         return types.Location(
@@ -392,7 +760,7 @@ def find_declaration(ls: BibliLanguageServer, params: types.DeclarationParams):
             [
                 types.TextEdit(
                     types.Range(types.Position(0, 0), types.Position(0, 0)),
-                    "# {title}".format(title=(entry.__getitem__("title")) or "Unknown"),
+                    "# {title}".format(title=entry.get("title") or "Unknown"),
                 )
             ],
         )
@@ -411,9 +779,18 @@ def find_declaration(ls: BibliLanguageServer, params: types.DeclarationParams):
 @SERVER.feature(types.TEXT_DOCUMENT_DIAGNOSTIC)
 def diagnostic(ls: BibliLanguageServer, params: types.DocumentDiagnosticParams):
     doc = ls.workspace.get_text_document(params.text_document.uri)
-    ls.diagnose(doc)
 
-    return types.RelatedFullDocumentDiagnosticReport(ls.diagnostics[doc.uri][1])
+    # Reuse the diagnostics of the current version, but never touch the
+    # per-line state the scheduler is replaying pending changes on.
+    version, diagnostics = ls.diagnostics.get(doc.uri, (None, None))
+    if diagnostics is None or doc.version is None or version != doc.version:
+        diagnostics = [
+            diagnostic
+            for idx, line in enumerate(doc.lines)
+            for diagnostic in ls.diagnose_line(idx, line)
+        ]
+
+    return types.RelatedFullDocumentDiagnosticReport(diagnostics)
 
 
 @SERVER.feature(types.TEXT_DOCUMENT_HOVER)
@@ -430,7 +807,7 @@ def hover(ls: BibliLanguageServer, params: types.HoverParams):
 
     (entry, library) = DATABASE.find_in_libraries(cite)
     if entry and library and library.path:
-        hover_text = build_doc_string(entry, CONFIG.hover.doc_format, str(library.path))
+        hover_text = DOC_CACHE.get(cite, entry, library, CONFIG.hover.doc_format)
 
         return types.Hover(
             contents=types.MarkupContent(
@@ -448,7 +825,7 @@ def hover(ls: BibliLanguageServer, params: types.HoverParams):
 @SERVER.feature(
     types.TEXT_DOCUMENT_COMPLETION,
     types.CompletionOptions(
-        # resolve_provider=True,
+        resolve_provider=True,
     ),
 )
 def completion(
@@ -490,7 +867,31 @@ def completion(
     if not should_complete:
         return None
 
-    if ls.completion_cache == []:
-        ls.rebuild_completion_items()
+    query = cite_prefix_at_position(
+        document.lines[params.position.line], params.position.character, CONFIG.cite
+    )
+    items = ls.search_completion_items(query)
+
+    # Ask the client to come back as the query narrows
+    return types.CompletionList(is_incomplete=True, items=items)
+
 
-    return types.CompletionList(is_incomplete=False, items=ls.completion_cache)
+@SERVER.feature(types.COMPLETION_ITEM_RESOLVE)
+def completion_resolve(
+    ls: BibliLanguageServer, item: types.CompletionItem
+) -> types.CompletionItem:
+    """completionItem/resolve: Add the documentation of the selected item."""
+
+    if not isinstance(item.data, dict) or "citekey" not in item.data:
+        return item
+
+    citekey = item.data["citekey"]
+    (entry, library) = DATABASE.find_in_libraries(citekey)
+    if entry and library:
+        item.documentation = types.MarkupContent(
+            kind=types.MarkupKind.Markdown,
+            value=DOC_CACHE.get(
+                citekey, entry, library, CONFIG.completion.doc_format
+            ),
+        )
+    return item
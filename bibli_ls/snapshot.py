@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from importlib.metadata import version
+
+from bibtexparser.model import Block
+
+logger = logging.getLogger(__name__)
+
+"""Bump when the snapshot layout changes to invalidate old snapshots"""
+SNAPSHOT_FORMAT = 2
+
+SNAPSHOT_VERSION = (SNAPSHOT_FORMAT, version("bibtexparser"))
+
+
+def get_snapshot_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "bibli_ls", "snapshots")
+
+
+def get_snapshot_path(bibfile_path: str) -> str:
+    name = hashlib.sha1(os.path.realpath(bibfile_path).encode()).hexdigest()
+    return os.path.join(get_snapshot_dir(), name + ".pickle")
+
+
+def snapshot_key(bibfile_path: str) -> tuple:
+    """Key identifying the state of a bibfile: path, size, mtime and content hash.
+
+    Compute it before reading the file for parsing, so that a file modified in
+    between does not get a snapshot matching its new state.
+    """
+    stat = os.stat(bibfile_path)
+    with open(bibfile_path, "rb") as f:
+        content_hash = hashlib.file_digest(f, hashlib.blake2b).hexdigest()
+
+    return (
+        os.path.realpath(bibfile_path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        content_hash,
+    )
+
+
+def load_snapshot(bibfile_path: str, key: tuple) -> list[Block] | None:
+    """Return the parsed blocks of `bibfile_path` if a snapshot matching `key`
+    exists. Stale, corrupted or missing snapshots return None."""
+    snapshot_path = get_snapshot_path(bibfile_path)
+    if not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot["version"] != SNAPSHOT_VERSION or snapshot["key"] != key:
+            logger.debug(f"Snapshot of `{bibfile_path}` is stale")
+            return None
+        return snapshot["blocks"]
+    except Exception as e:
+        logger.warning(f"Ignoring corrupted snapshot `{snapshot_path}`: {e}")
+        return None
+
+
+def save_snapshot(bibfile_path: str, key: tuple, blocks: list[Block]):
+    snapshot_dir = get_snapshot_dir()
+    snapshot = {"version": SNAPSHOT_VERSION, "key": key, "blocks": blocks}
+
+    tmp_path = None
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, get_snapshot_path(bibfile_path))
+    except Exception as e:
+        logger.warning(f"Failed to write snapshot of `{bibfile_path}`: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,418 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from .database import BibliBibDatabase, BibliEntry, BibliLibrary, COMMON_FIELDS
+
+logger = logging.getLogger(__name__)
+
+"""Bump when the schema changes, older stores are then rebuilt"""
+STORE_SCHEMA_VERSION = 1
+
+"""Fields searched with full-text search"""
+FTS_FIELDS = ("title", "author", "abstract")
+
+"""Upper bound of the keys sharing a prefix"""
+_MAX_CHAR = "\U0010ffff"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS libraries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    backend TEXT NOT NULL,
+    backend_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    library_id INTEGER NOT NULL,
+    citekey TEXT NOT NULL,
+    search_key TEXT NOT NULL,
+    entry_type TEXT NOT NULL,
+    key_line INTEGER,
+    key_start INTEGER,
+    key_end INTEGER,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_citekey ON entries (citekey);
+CREATE INDEX IF NOT EXISTS entries_search_key ON entries (search_key);
+CREATE INDEX IF NOT EXISTS entries_library ON entries (library_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5 (
+    {", ".join(FTS_FIELDS)}, tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+_ENTRY_COLUMNS = (
+    "e.library_id, e.citekey, e.entry_type, e.key_line, e.key_start, e.key_end, "
+    "e.fields"
+)
+
+_PRECEDENCE = "l.backend_position, l.position, e.id"
+
+
+def fts_query(text: str, fields: tuple[str, ...]) -> str:
+    """FTS5 query matching entries whose `fields` contain words starting with
+    each of the words of `text`."""
+    phrases = " ".join('"' + word.replace('"', '""') + '"*' for word in text.split())
+    return "{" + " ".join(fields) + "} : " + phrases
+
+
+def glob_escape(text: str) -> str:
+    return "".join(f"[{c}]" if c in "*?[" else c for c in text)
+
+
+class SQLiteStore:
+    """Entries of all libraries in a SQLite database.
+
+    Writes go through a single connection, while each reading thread has its
+    own. The database is in WAL mode so that readers are not blocked while a
+    backend is being written.
+    """
+
+    path: str
+
+    libraries: dict[int, BibliLibrary]
+    """Stored libraries by row, their entries are not kept in memory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.libraries = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        version = self._writer.execute("PRAGMA user_version").fetchone()[0]
+        if version != STORE_SCHEMA_VERSION:
+            logger.info(f"Creating library store `{path}`")
+            with self._writer:
+                for table in ["libraries", "entries", "entries_fts", "sqlite_sequence"]:
+                    self._writer.execute(f"DROP TABLE IF EXISTS {table}")
+                self._writer.executescript(SCHEMA)
+                self._writer.execute(f"PRAGMA user_version = {STORE_SCHEMA_VERSION}")
+
+    def close(self):
+        self._writer.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path)
+        return connection
+
+    def load_libraries(self, backends: list[str]) -> dict[str, list[BibliLibrary]]:
+        """Libraries stored in an earlier session, without their entries, in
+        the order of `backends`. Libraries of backends not in `backends` are
+        removed."""
+        with self._lock, self._writer:
+            rows = self._writer.execute(
+                "SELECT id, backend, path FROM libraries ORDER BY position"
+            ).fetchall()
+
+            stored: dict[str, list[BibliLibrary]] = {}
+            for library_id, backend, path in rows:
+                if backend not in backends:
+                    self._delete_library(library_id)
+                    continue
+
+                library = BibliLibrary(path=Path(path) if path else None)
+                library.store_id = library_id
+                self.libraries[library_id] = library
+                stored.setdefault(backend, []).append(library)
+
+            # The configured order may have changed since they were stored
+            for backend in stored:
+                self._writer.execute(
+                    "UPDATE libraries SET backend_position = ? WHERE backend = ?",
+                    (backends.index(backend), backend),
+                )
+        return {backend: stored[backend] for backend in backends if backend in stored}
+
+    def _delete_library(self, library_id: int):
+        self._writer.execute(
+            "DELETE FROM entries_fts WHERE rowid IN"
+            " (SELECT id FROM entries WHERE library_id = ?)",
+            (library_id,),
+        )
+        self._writer.execute("DELETE FROM entries WHERE library_id = ?", (library_id,))
+        self._writer.execute("DELETE FROM libraries WHERE id = ?", (library_id,))
+
+    def write_libraries(
+        self, backend: str, backend_position: int, libraries: list[BibliLibrary]
+    ):
+        """Replace the stored libraries of `backend`. Libraries already stored
+        keep their entries, the entries of the others are moved from memory to
+        the store."""
+        written: list[BibliLibrary] = []
+        removed: list[int] = []
+        with self._lock:
+            try:
+                with self._writer:
+                    self._write_libraries(
+                        backend, backend_position, libraries, written, removed
+                    )
+            except BaseException:
+                # Rolled back
+                for library in written:
+                    if library.store_id is not None:
+                        self.libraries.pop(library.store_id, None)
+                    library.store_id = None
+                raise
+
+            for library_id in removed:
+                self.libraries.pop(library_id, None)
+
+        # Entries are read back from the store once committed
+        for library in written:
+            library.entries_dict = {}
+            library.columns = [[] for _ in COMMON_FIELDS]
+
+    def _write_libraries(
+        self,
+        backend: str,
+        backend_position: int,
+        libraries: list[BibliLibrary],
+        written: list[BibliLibrary],
+        removed: list[int],
+    ):
+        stored = {lib.store_id for lib in libraries if lib.store_id is not None}
+        for (library_id,) in self._writer.execute(
+            "SELECT id FROM libraries WHERE backend = ?", (backend,)
+        ).fetchall():
+            if library_id not in stored:
+                self._delete_library(library_id)
+                removed.append(library_id)
+
+        (next_id,) = self._writer.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM entries"
+        ).fetchone()
+        for position, library in enumerate(libraries):
+            if library.store_id is not None:
+                self._writer.execute(
+                    "UPDATE libraries SET backend_position = ?, position = ?"
+                    " WHERE id = ?",
+                    (backend_position, position, library.store_id),
+                )
+                continue
+
+            cursor = self._writer.execute(
+                "INSERT INTO libraries (backend, backend_position, position, path)"
+                " VALUES (?, ?, ?, ?)",
+                (
+                    backend,
+                    backend_position,
+                    position,
+                    str(library.path) if library.path else None,
+                ),
+            )
+            library_id = cursor.lastrowid
+            assert library_id is not None
+            library.store_id = library_id
+            written.append(library)
+            self.libraries[library_id] = library
+            next_id = self._insert_entries(library, next_id)
+
+    def _insert_entries(self, library: BibliLibrary, next_id: int) -> int:
+        """Insert the entries of `library` with rows from `next_id`. Return
+        the row after the last one."""
+        rows = []
+        fts_rows = []
+        for entry_id, entry in enumerate(library.entries_dict.values(), next_id):
+            key_span = entry.key_span or (None, None, None)
+            fields = json.dumps(list(entry.items()), default=str)
+            rows.append(
+                (
+                    entry_id,
+                    library.store_id,
+                    entry.key,
+                    entry.key.lower(),
+                    entry.entry_type,
+                    *key_span,
+                    fields,
+                )
+            )
+            fts_rows.append((entry_id, *(str(entry.get(f, "")) for f in FTS_FIELDS)))
+
+        self._writer.executemany(
+            "INSERT INTO entries (id, library_id, citekey, search_key, entry_type,"
+            " key_line, key_start, key_end, fields) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._writer.executemany(
+            f"INSERT INTO entries_fts (rowid, {', '.join(FTS_FIELDS)})"
+            f" VALUES (?, {', '.join('?' for _ in FTS_FIELDS)})",
+            fts_rows,
+        )
+        return next_id + len(rows)
+
+    def _make_entry(self, row: tuple) -> tuple[BibliEntry, BibliLibrary] | None:
+        library_id, citekey, entry_type, line, start, end, fields = row
+        library = self.libraries.get(library_id)
+        if library is None:
+            return None
+        key_span = (line, start, end) if line is not None else None
+        entry = BibliEntry(citekey, entry_type, json.loads(fields), key_span)
+        return entry, library
+
+    def find(self, citekey: str) -> tuple[BibliEntry, BibliLibrary] | None:
+        """Entry of `citekey` in the first library defining it"""
+        # Fetching all rows ends the read, later ones see newer writes
+        rows = (
+            self._reader()
+            .execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM entries e"
+                " JOIN libraries l ON l.id = e.library_id"
+                f" WHERE e.citekey = ? ORDER BY {_PRECEDENCE} LIMIT 1",
+                (citekey,),
+            )
+            .fetchall()
+        )
+        return self._make_entry(rows[0]) if rows else None
+
+    def find_shadowed(self) -> dict[str, list[tuple[BibliEntry, BibliLibrary]]]:
+        """Entries hidden by an earlier definition of the same citekey, as
+        `BibliBibDatabase.shadowed`"""
+        rows = (
+            self._reader()
+            .execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM entries e"
+                " JOIN libraries l ON l.id = e.library_id"
+                " WHERE e.citekey IN (SELECT citekey FROM entries"
+                " GROUP BY citekey HAVING COUNT(*) > 1)"
+                f" ORDER BY e.citekey, {_PRECEDENCE}"
+            )
+            .fetchall()
+        )
+
+        shadowed: dict[str, list[tuple[BibliEntry, BibliLibrary]]] = {}
+        defined = set()
+        for row in rows:
+            result = self._make_entry(row)
+            if result is None:
+                continue
+            key = result[0].key
+            if key in defined:
+                shadowed.setdefault(key, []).append(result)
+            defined.add(key)
+        return shadowed
+
+    def search(self, query: str, limit: int) -> list[tuple[BibliEntry, BibliLibrary]]:
+        """Entries to complete `query` with, at most `limit` of them, all if 0.
+
+        Candidates are looked up with the same tiers as a `CompletionIndex`,
+        using the indexes of the store: citekeys starting with the query,
+        citekeys containing it, authors and titles with words starting with
+        each of its words, then citekeys containing its characters in order.
+        Rows are streamed, each tier stops as soon as enough keys are found.
+        """
+        query = query.lower()
+        if not query:
+            tiers = [("SELECT citekey FROM entries ORDER BY id", ())]
+        else:
+            tiers = [
+                (
+                    "SELECT citekey FROM entries"
+                    " WHERE search_key >= ? AND search_key < ? ORDER BY search_key",
+                    (query, query + _MAX_CHAR),
+                ),
+                (
+                    "SELECT citekey FROM entries WHERE instr(search_key, ?) > 0"
+                    " ORDER BY id",
+                    (query,),
+                ),
+            ]
+            if query.split():
+                tiers.append(
+                    (
+                        "SELECT e.citekey FROM entries_fts f"
+                        " JOIN entries e ON e.id = f.rowid"
+                        " WHERE entries_fts MATCH ? ORDER BY f.rowid",
+                        (fts_query(query, ("title", "author")),),
+                    )
+                )
+            fuzzy = "*" + "*".join(glob_escape(c) for c in query) + "*"
+            tiers.append(
+                (
+                    "SELECT citekey FROM entries WHERE search_key GLOB ? ORDER BY id",
+                    (fuzzy,),
+                )
+            )
+
+        found: dict[str, None] = {}
+        reader = self._reader()
+        for sql, params in tiers:
+            cursor = reader.execute(sql, params)
+            try:
+                for (citekey,) in cursor:
+                    found.setdefault(citekey)
+                    if limit and len(found) >= limit:
+                        break
+            finally:
+                cursor.close()
+            if limit and len(found) >= limit:
+                break
+
+        # Shadowed entries are matched too, resolve the entries of each key
+        results = []
+        for citekey in found:
+            result = self.find(citekey)
+            if result:
+                results.append(result)
+        return results
+
+
+class SQLiteBibDatabase(BibliBibDatabase):
+    """Database keeping the entries in a `SQLiteStore` rather than in memory.
+
+    Libraries stored by an earlier session are available right away, until
+    their backends load them again.
+    """
+
+    store: SQLiteStore
+
+    backends: list[str]
+    """Configured backends, the first one defining a key wins"""
+
+    def __init__(self, path: str, backends: list[str]) -> None:
+        super().__init__()
+        self.backends = backends
+        self.store = SQLiteStore(path)
+        self.libraries = self.store.load_libraries(backends)
+        if self.libraries:
+            self.generation = 1
+            self.generations = {backend: 1 for backend in self.libraries}
+            for libraries in self.libraries.values():
+                for library in libraries:
+                    library.generation = 1
+            self.rebuild_index()
+
+    def backend_position(self, backend: str) -> int:
+        if backend in self.backends:
+            return self.backends.index(backend)
+        return len(self.backends)
+
+    def set_libraries(self, backend: str, libraries: list[BibliLibrary]):
+        self.store.write_libraries(backend, self.backend_position(backend), libraries)
+        if backend not in self.libraries:
+            # Keep the configured order, stored backends were added first
+            added = {**self.libraries, backend: []}
+            self.libraries = dict(
+                sorted(added.items(), key=lambda b: self.backend_position(b[0]))
+            )
+        super().set_libraries(backend, libraries)
+
+    def rebuild_index(self):
+        # Keys are looked up in the store, only the shadowed entries are kept
+        self.index, self.shadowed = {}, self.store.find_shadowed()
+
+    def find_in_libraries(
+        self, key: str
+    ) -> tuple[BibliEntry, BibliLibrary] | tuple[None, None]:
+        return self.store.find(key) or (None, None)
+
+    def search(self, query: str, limit: int) -> list[tuple[BibliEntry, BibliLibrary]]:
+        return self.store.search(query, limit)
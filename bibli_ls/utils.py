@@ -1,20 +1,20 @@
 from os import path
 import re
-from typing import List
+from typing import Any, List
 
 from bibtexparser.exceptions import ParserStateException, ParsingException
-from bibtexparser.model import Entry, Field
 from lsprotocol.types import MessageType, Position, ShowMessageParams
 from pygls.lsp.server import LanguageServer
 from pygls.workspace import TextDocument
 import logging
 from typing_extensions import assert_type
-import requests
 
-from bibli_ls.database import BibliBibDatabase
+from bibli_ls.database import BibliBibDatabase, BibliEntry
 
 
+from .better_bibtex import BetterBibTeXClient
 from .bibli_config import BibliTomlConfig, DocFormatingConfig, NoteConfig
+from .markdown import render_list_doc
 
 logger = logging.getLogger(__name__)
 
@@ -30,21 +30,6 @@ def show_message(
     )
 
 
-def get_item_attachments_bbt(cite: str):
-    url = "http://localhost:23119/better-bibtex/json-rpc"
-
-    headers = {"Content-Type": "application/json", "Accept": "application/json"}
-    payload = {"jsonrpc": "2.0", "method": "item.attachments", "params": [cite]}
-
-    attachments = []
-    response = requests.post(url, json=payload, headers=headers)
-    data = response.json()
-    for attachment in data["result"]:
-        attachments.append(attachment["open"])
-
-    return attachments
-
-
 def get_note_uri(ls: LanguageServer, cite: str, config: NoteConfig):
     format_dict = {"citekey": cite}
 
@@ -59,8 +44,14 @@ def get_note_uri(ls: LanguageServer, cite: str, config: NoteConfig):
 
 
 def get_cite_uri(
-    db: BibliBibDatabase, cite: str, config: BibliTomlConfig
+    db: BibliBibDatabase,
+    cite: str,
+    config: BibliTomlConfig,
+    bbt_client: BetterBibTeXClient | None = None,
+    prefetch: list[str] | None = None,
 ) -> str | None:
+    """URI to view `cite` with. With the `zotero_bbt` viewer, the attachments
+    of the citekeys in `prefetch` are looked up at the same time."""
     (entry, _) = db.find_in_libraries(cite)
 
     if not entry:
@@ -69,8 +60,8 @@ def get_cite_uri(
     uri = None
     match config.view.viewer:
         case "browser":
-            if entry.fields_dict.get("url"):
-                uri = entry.fields_dict["url"].value
+            if entry.get("url"):
+                uri = entry["url"]
         case "zotero":
             uri = f"zotero://select/items/{cite}"
 
@@ -79,32 +70,72 @@ def get_cite_uri(
             # uri. See more:
             # - https://retorque.re/zotero-better-bibtex/exporting/json-rpc/index.html
             # - https://github.com/retorquere/zotero-better-bibtex/issues/1347
-            uri = get_item_attachments_bbt(cite)[0]
+            uri = (bbt_client or BetterBibTeXClient()).get_attachment_uri(
+                cite, prefetch
+            )
     return uri
 
 
-def preprocess_bib_entry(entry: Entry, config: DocFormatingConfig):
-    replace_list = ["{{", "}}", "\\vphantom", "\\{", "\\}"]
-    for f in entry.fields:
-        if isinstance(f.value, str):
-            for r in replace_list:
-                f.value = f.value.replace(r, "")
+"""Markup removed from field values before displaying them"""
+DISPLAY_REPLACE_LIST = ["{{", "}}", "\\vphantom", "\\{", "\\}"]
+
+
+def build_display_fields(entry: BibliEntry) -> dict[str, Any]:
+    """Field values of `entry` cleaned up for display, leaving the entry
+    untouched."""
+    display_fields = {}
+    for name, value in entry.items():
+        if isinstance(value, str):
+            for r in DISPLAY_REPLACE_LIST:
+                value = value.replace(r, "")
+            value = value.replace("\n", " ")
+        display_fields[name] = value
+    return display_fields
+
+
+def build_entry_detail(entry: BibliEntry) -> str:
+    """Short `Author et al. (year)` description of an entry."""
+    author = ""
+    if isinstance(entry.get("author"), str):
+        authors = [a for a in entry["author"].split(" and ") if a.strip()]
+        if authors:
+            first = authors[0].strip("{} \n")
+            # `Last, First` or `First Last`
+            if "," in first:
+                author = first.split(",")[0]
+            else:
+                author = "".join(first.split()[-1:])
+            author = author.strip("{} ")
+            if len(authors) > 1:
+                author += " et al."
 
-            f.value = f.value.replace("\n", " ")
-            if len(f.value) > config.character_limit:
-                f.value = f.value[: config.character_limit] + "..."
+    year = ""
+    for key in ["year", "date"]:
+        if isinstance(entry.get(key), str):
+            year = entry[key].strip("{} ")[:4]
+            break
 
-            entry.set_field(Field(f.key, f.value))
+    if author and year:
+        return f"{author} ({year})"
+    return author or year
 
 
 def build_doc_string(
-    entry: Entry, config: DocFormatingConfig, bibfile: str | None = None
+    entry: BibliEntry,
+    config: DocFormatingConfig,
+    bibfile: str | None = None,
+    display_fields: dict[str, Any] | None = None,
 ):
-    import mdformat
-
-    preprocess_bib_entry(entry, config)
+    """Render the documentation of `entry`. `display_fields` can be passed
+    if already computed by `build_display_fields`."""
+    if display_fields is None:
+        display_fields = build_display_fields(entry)
 
-    field_dict = {f.key: f.value for f in entry.fields}
+    limit = config.character_limit
+    field_dict = {
+        k: v[:limit] + "..." if isinstance(v, str) and len(v) > limit else v
+        for k, v in display_fields.items()
+    }
 
     field_dict["entry_type"] = entry.entry_type
     if bibfile:
@@ -112,13 +143,15 @@ def build_doc_string(
 
     doc_string = ""
 
+    if isinstance(config.header_format, List):
+        header_format = "\n".join(config.header_format)
+    else:
+        assert_type(config.header_format, str)
+        header_format = config.header_format
+
     while True:
         try:
-            if isinstance(config.header_format, List):
-                doc_string += "\n".join(config.header_format).format(**field_dict)
-            else:
-                assert_type(config.header_format, str)
-                doc_string += config.header_format.format(**field_dict)
+            doc_string += header_format.format(**field_dict)
         except KeyError as e:
             # Unknown key in the header format
             field_dict[e.args[0]] = "Unknown"
@@ -157,14 +190,26 @@ def build_doc_string(
             )
             doc_string += table
         case "list":
-            for k, v in show_field_dict.items():
-                doc_string += f"- __{k}__: {v}\n"
-
-            # Do one last beautifying for list
-            doc_string = mdformat.text(
-                doc_string,
-                options={"wrap": config.wrap},
+            # Plain text entries are formatted natively, mdformat is slow
+            native = render_list_doc(
+                header_format,
+                field_dict | {"entry_type": entry.entry_type},
+                show_field_dict,
+                config.wrap,
             )
+            if native is not None:
+                doc_string = native
+            else:
+                import mdformat
+
+                for k, v in show_field_dict.items():
+                    doc_string += f"- __{k}__: {v}\n"
+
+                # Do one last beautifying for list
+                doc_string = mdformat.text(
+                    doc_string,
+                    options={"wrap": config.wrap},
+                )
 
     while True:
         try:
@@ -0,0 +1,248 @@
+import contextlib
+import logging
+import os
+import threading
+from typing import Callable, Iterable
+
+from watchdog.events import (
+    EVENT_TYPE_CLOSED,
+    EVENT_TYPE_CREATED,
+    EVENT_TYPE_DELETED,
+    EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_MOVED,
+    FileSystemEvent,
+    FileSystemEventHandler,
+)
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver, ObservedWatch
+
+from .cite_index import is_ignored_directory
+
+logger = logging.getLogger(__name__)
+
+# watchdog logs every inotify event at debug level. When the log file lives next
+# to a watched bibfile, each of those log lines triggers another event.
+logging.getLogger("watchdog").setLevel(logging.INFO)
+
+"""Seconds to wait for a burst of writes to a file to settle"""
+DEFAULT_DEBOUNCE_DELAY = 0.5
+
+RELOAD_EVENTS = [
+    EVENT_TYPE_CLOSED,
+    EVENT_TYPE_CREATED,
+    EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_MOVED,
+]
+
+WORKSPACE_EVENTS = RELOAD_EVENTS + [EVENT_TYPE_DELETED]
+
+
+class BibfileWatcher(FileSystemEventHandler):
+    """Watch a set of files and call `callback` with the path of each one that
+    changed on disk.
+
+    Editors usually save with several writes (or a write and a rename), so
+    events for the same file are debounced and reported once.
+    """
+
+    _callback: Callable[[str], None]
+    _delay: float
+    _paths: set[str]
+    _timers: dict[str, threading.Timer]
+    _observer: BaseObserver | None
+
+    def __init__(
+        self, callback: Callable[[str], None], delay: float = DEFAULT_DEBOUNCE_DELAY
+    ):
+        self._callback = callback
+        self._delay = delay
+        self._paths = set()
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._observer = None
+
+    def start(self, paths: Iterable[str]):
+        """(Re)start watching `paths`."""
+        self.stop()
+
+        self._paths = {os.path.realpath(p) for p in paths}
+        if not self._paths:
+            return
+
+        observer = Observer()
+        # Watch the parent directories, so that files replaced by a rename are
+        # still tracked.
+        for directory in {os.path.dirname(p) for p in self._paths}:
+            if os.path.isdir(directory):
+                observer.schedule(self, directory, recursive=False)
+        observer.start()
+        self._observer = observer
+        logger.info(f"Watching bibfiles {sorted(self._paths)}")
+
+    def stop(self):
+        if self._observer:
+            self._observer.stop()
+            self._observer = None
+
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory or event.event_type not in RELOAD_EVENTS:
+            return
+
+        for path in (event.src_path, event.dest_path):
+            path = os.path.realpath(os.fsdecode(path)) if path else ""
+            if path in self._paths:
+                self._schedule(path)
+
+    def _schedule(self, path: str):
+        with self._lock:
+            timer = self._timers.get(path)
+            if timer:
+                timer.cancel()
+
+            timer = threading.Timer(self._delay, self._fire, [path])
+            timer.daemon = True
+            self._timers[path] = timer
+            timer.start()
+
+    def _fire(self, path: str):
+        with self._lock:
+            self._timers.pop(path, None)
+
+        logger.info(f"Bibfile `{path}` changed on disk")
+        try:
+            self._callback(path)
+        except Exception as e:
+            logger.error(f"Failed to reload `{path}`: {e}")
+
+
+class WorkspaceWatcher(FileSystemEventHandler):
+    """Call `callback` with the path of every file created, modified, moved or
+    deleted under a directory.
+
+    Each directory is watched on its own, so that directories which are never
+    indexed (see `is_ignored_directory`) do not use up inotify watches.
+    Directories created or moved in later are watched as they appear.
+    """
+
+    _callback: Callable[[str], None]
+    _observer: BaseObserver | None
+    _watches: dict[str, ObservedWatch]
+
+    def __init__(self, callback: Callable[[str], None]):
+        self._callback = callback
+        self._observer = None
+        self._watches = {}
+        self._lock = threading.Lock()
+
+    def start(self, root_path: str):
+        """(Re)start watching `root_path`.
+
+        Watching big trees may fail, e.g. when the inotify watch limit is
+        reached. Changes on disk are then no longer reported.
+        """
+        self.stop()
+
+        observer = Observer()
+        with self._lock:
+            self._observer = observer
+        try:
+            observer.start()
+            self._watch_tree(observer, root_path)
+        except OSError as e:
+            logger.warning(f"Not watching `{root_path}` for changes: {e}")
+            self.stop()
+            return
+
+        logger.info(f"Watching {len(self._watches)} directories in `{root_path}`")
+
+    def stop(self):
+        with self._lock:
+            observer, self._observer = self._observer, None
+            self._watches = {}
+        if observer:
+            observer.stop()
+
+    def _watch_tree(self, observer: BaseObserver, top: str, report: bool = False):
+        """Watch `top` and the directories under it which are not ignored. With
+        `report`, the files already in them are reported as changed."""
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not is_ignored_directory(d)]
+            with self._lock:
+                if observer is not self._observer:
+                    # Stopped meanwhile
+                    return
+                watched = dirpath in self._watches
+
+            # Not under our lock, the observer holds its own while dispatching
+            # events to `on_any_event`
+            if not watched:
+                try:
+                    watch = observer.schedule(self, dirpath, recursive=False)
+                except FileNotFoundError:
+                    continue
+                with self._lock:
+                    self._watches[dirpath] = watch
+
+            if report:
+                for filename in filenames:
+                    self._callback(os.path.join(dirpath, filename))
+
+    def _unwatch_tree(self, observer: BaseObserver, top: str):
+        with self._lock:
+            watches = [
+                self._watches.pop(path)
+                for path in list(self._watches)
+                if path == top or path.startswith(top + os.sep)
+            ]
+        for watch in watches:
+            with contextlib.suppress(KeyError):
+                observer.unschedule(watch)
+
+    def _on_directory_event(self, event_type: str, src_path: str, dest_path: str):
+        observer = self._observer
+        if not observer:
+            return
+
+        if event_type in [EVENT_TYPE_DELETED, EVENT_TYPE_MOVED]:
+            self._unwatch_tree(observer, src_path)
+
+        if event_type == EVENT_TYPE_MOVED:
+            # Moving a directory reports no event for the files in it
+            for dirpath, _, filenames in os.walk(dest_path):
+                relpath = os.path.relpath(dirpath, dest_path)
+                for filename in filenames:
+                    self._callback(os.path.join(src_path, relpath, filename))
+            new_path = dest_path
+        elif event_type == EVENT_TYPE_CREATED:
+            new_path = src_path
+        else:
+            return
+
+        parent = os.path.dirname(new_path)
+        if parent not in self._watches or is_ignored_directory(
+            os.path.basename(new_path)
+        ):
+            return
+        try:
+            self._watch_tree(observer, new_path, report=True)
+        except OSError as e:
+            logger.warning(f"Not watching `{new_path}` for changes: {e}")
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.event_type not in WORKSPACE_EVENTS:
+            return
+
+        src_path = os.fsdecode(event.src_path)
+        dest_path = os.fsdecode(event.dest_path) if event.dest_path else ""
+        if event.is_directory:
+            self._on_directory_event(event.event_type, src_path, dest_path)
+            return
+
+        for path in (src_path, dest_path):
+            if path:
+                self._callback(path)
@@ -1,16 +1,33 @@
+from lsprotocol import types
 from lsprotocol.types import ClientCapabilities, InitializeParams, InitializedParams
 from pygls.lsp._base_client import BaseLanguageClient
+import asyncio
 import sys
 import os
+import tempfile
 
+from bibli_ls.server import LOAD_PROGRESS_TOKEN
 from tests import PROJECT_ROOT, TEST_ROOT
 from tests.utils import as_uri
 
 
 class BibliClient(BaseLanguageClient):
-    def __init__(self, test_root=TEST_ROOT):
+    def __init__(self, test_root=TEST_ROOT, wait_for_libraries=True):
         super().__init__("bibli-test", "0.1")
         self._test_root = test_root
+        self._wait_for_libraries = wait_for_libraries
+        self.libraries_loaded = asyncio.Event()
+        # Snapshots of the bibfiles are written here rather than to ~/.cache
+        self._cache_home = tempfile.TemporaryDirectory()
+
+        @self.feature(types.WINDOW_WORK_DONE_PROGRESS_CREATE)
+        def create_progress(params: types.WorkDoneProgressCreateParams):
+            return None
+
+        @self.feature(types.PROGRESS)
+        def progress(params: types.ProgressParams):
+            if params.token == LOAD_PROGRESS_TOKEN and params.value["kind"] == "end":
+                self.libraries_loaded.set()
 
     async def __aenter__(self):
         await self.start_io(
@@ -19,6 +36,7 @@ class BibliClient(BaseLanguageClient):
             "--log-file",
             os.path.join(self._test_root, "test_lsp.log"),
             "-vvv",
+            env=os.environ | {"XDG_CACHE_HOME": self._cache_home.name},
         )
 
         response = await self.initialize_async(
@@ -31,6 +49,10 @@ class BibliClient(BaseLanguageClient):
         assert response
 
         self.initialized(InitializedParams())
+
+        # Libraries are loaded in the background after initialization
+        if self._wait_for_libraries:
+            await asyncio.wait_for(self.libraries_loaded.wait(), 10)
         # response = await self.initialize_async(
         #     InitializeParams(
         #         capabilities=ClientCapabilities(),
@@ -43,5 +65,5 @@ class BibliClient(BaseLanguageClient):
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.shutdown_async(None)
-        pass
+        self._cache_home.cleanup()
         # await self.stop()
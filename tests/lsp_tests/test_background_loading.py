@@ -0,0 +1,84 @@
+"""Tests for loading libraries in the background."""
+
+import asyncio
+import os
+import shutil
+
+import pytest
+from hamcrest import assert_that, is_
+from lsprotocol import types
+
+from tests import TEST_DATA
+from tests.client import BibliClient
+from tests.utils import as_uri
+
+CONFIG = """
+[backends.local]
+backend_type = "bibfile"
+bibfiles = ["references.bib"]
+
+[backends.slow]
+backend_type = "bibfile"
+bibfiles = ["slow.bib"]
+cache = false
+"""
+
+
+def write_fifo(path: str, content: str):
+    # Blocks until the server reads the bibfile
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.mark.asyncio
+async def test_initialize_does_not_wait_for_libraries(tmp_path):
+    """Test that initialize returns while a backend is still loading, and that
+    open documents are checked again once it is loaded"""
+
+    shutil.copytree(TEST_DATA, tmp_path, dirs_exist_ok=True)
+    (tmp_path / ".bibli.toml").write_text(CONFIG)
+    (tmp_path / "background.md").write_text("[@test1] [@slow1]\n")
+    # Reading the bibfile of the slow backend blocks until it is written to
+    os.mkfifo(tmp_path / "slow.bib")
+
+    client = BibliClient(tmp_path, wait_for_libraries=False)
+    published: list[types.PublishDiagnosticsParams] = []
+
+    @client.feature(types.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS)
+    def on_publish(params: types.PublishDiagnosticsParams):
+        published.append(params)
+
+    def last_messages():
+        return [d.message for d in published[-1].diagnostics] if published else None
+
+    async def missing_keys(expected: list[str]):
+        for _ in range(50):
+            if last_messages() == expected:
+                break
+            await asyncio.sleep(0.1)
+        return last_messages()
+
+    async with client:
+        uri = as_uri(tmp_path / "background.md")
+        client.text_document_did_open(
+            types.DidOpenTextDocumentParams(
+                types.TextDocumentItem(
+                    uri, "markdown", 0, (tmp_path / "background.md").read_text()
+                )
+            )
+        )
+
+        # Answered from the backend loaded so far
+        expected = ['Item "slow1" does not exist in library']
+        assert_that(await missing_keys(expected), is_(expected))
+        assert_that(client.libraries_loaded.is_set(), is_(False))
+
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            write_fifo,
+            str(tmp_path / "slow.bib"),
+            "@article{slow1,\n  title = {title},\n}\n",
+        )
+        await asyncio.wait_for(client.libraries_loaded.wait(), 10)
+
+        assert_that(await missing_keys([]), is_([]))
@@ -40,6 +40,12 @@ async def test_completion():
         assert_that(actual.items[2].label, is_("@test3"))
         assert_that(actual.items[3].label, is_("@reference_test"))
 
+        assert_that(actual.items[0].detail, is_("john_snow (1984)"))
+        # Documentation is only sent on resolve
+        assert_that(actual.items[0].documentation, is_(None))
+        resolved = await client.completion_item_resolve_async(actual.items[0])
+        assert resolved.documentation
+        assert_that("title" in resolved.documentation.value, is_(True))
 
         actual = await client.text_document_completion_async(
             CompletionParams(
@@ -0,0 +1,66 @@
+"""Tests for parsing several bibfiles in parallel."""
+
+import pytest
+from hamcrest import assert_that, contains_string, is_
+from lsprotocol.types import (
+    DocumentDiagnosticParams,
+    HoverParams,
+    Position,
+    TextDocumentIdentifier,
+)
+
+from tests.client import BibliClient
+from tests.utils import as_uri
+
+CONFIG = """
+[backends]
+[backends.bibfile]
+backend_type = "bibfile"
+bibfiles = ["first.bib", "second.bib"]
+cache = false
+parse_workers = 2
+"""
+
+ENTRY = """@article{{{key},
+  author = {{author {key}}},
+  title = {{A long enough title for entry {key} so that the bibfile gets big}},
+  journal = {{journal}},
+  abstract = {{{abstract}}},
+  year = {{{year}}},
+}}
+
+"""
+
+
+def write_bibfile(path, prefix, year, count=2500):
+    with open(path, "w") as f:
+        f.write(ENTRY.format(key="shared", abstract="shared", year=year))
+        for i in range(count):
+            f.write(ENTRY.format(key=f"{prefix}{i}", abstract="x" * 100, year=year))
+
+
+@pytest.mark.asyncio
+async def test_parallel_parse(tmp_path):
+    """Test that bibfiles parsed in parallel keep their configured precedence"""
+
+    (tmp_path / ".bibli.toml").write_text(CONFIG)
+    write_bibfile(tmp_path / "first.bib", "a", 1111)
+    write_bibfile(tmp_path / "second.bib", "b", 2222)
+    (tmp_path / "test.md").write_text("[@shared] [@a0; @b2499; @c0]\n")
+
+    async with BibliClient(tmp_path) as client:
+        uri = as_uri(tmp_path / "test.md")
+
+        actual = await client.text_document_hover_async(
+            HoverParams(TextDocumentIdentifier(uri), Position(line=0, character=2))
+        )
+        assert actual
+        assert_that(str(actual), contains_string("1111"))
+
+        actual = await client.text_document_diagnostic_async(
+            DocumentDiagnosticParams(TextDocumentIdentifier(uri))
+        )
+        assert_that(
+            [d.message for d in actual.items],
+            is_(['Item "c0" does not exist in library']),
+        )
@@ -0,0 +1,81 @@
+"""Tests for published diagnostics."""
+
+import asyncio
+
+import pytest
+from hamcrest import assert_that, is_
+from lsprotocol import types
+
+from tests import TEST_DATA
+from tests.client import BibliClient
+from tests.utils import as_uri
+
+
+async def wait_for(published: list, count: int):
+    for _ in range(50):
+        if len(published) >= count:
+            break
+        await asyncio.sleep(0.1)
+    # Leave time for unexpected notifications
+    await asyncio.sleep(0.5)
+
+
+def open_document(client: BibliClient, name: str) -> str:
+    uri = as_uri(TEST_DATA / name)
+    client.text_document_did_open(
+        types.DidOpenTextDocumentParams(
+            types.TextDocumentItem(
+                uri, "markdown", 0, (TEST_DATA / name).read_text("utf-8")
+            )
+        )
+    )
+    return uri
+
+
+def append(client: BibliClient, uri: str, version: int, line: int, text: str):
+    client.text_document_did_change(
+        types.DidChangeTextDocumentParams(
+            types.VersionedTextDocumentIdentifier(version, uri),
+            [
+                types.TextDocumentContentChangePartial(
+                    range=types.Range(
+                        types.Position(line, 0), types.Position(line, 0)
+                    ),
+                    text=text,
+                )
+            ],
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_publish_only_changed_document():
+    """Test that diagnostics are only published for the changed document, and
+    only when they differ from the last ones published"""
+
+    async with BibliClient(TEST_DATA) as client:
+        published: list[types.PublishDiagnosticsParams] = []
+
+        @client.feature(types.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS)
+        def on_publish(params: types.PublishDiagnosticsParams):
+            published.append(params)
+
+        diagnostic_uri = open_document(client, "diagnostic_test.md")
+        reference_uri = open_document(client, "reference_test_1.md")
+        await wait_for(published, 2)
+        assert_that(
+            sorted((p.uri, len(p.diagnostics)) for p in published),
+            is_(sorted([(diagnostic_uri, 3), (reference_uri, 0)])),
+        )
+
+        published.clear()
+        append(client, diagnostic_uri, 1, 0, "no citation here ")
+        await wait_for(published, 1)
+        assert_that(published, is_([]))
+
+        append(client, diagnostic_uri, 2, 0, "[@unknown4]\n")
+        await wait_for(published, 1)
+        assert_that(
+            [(p.uri, p.version, len(p.diagnostics)) for p in published],
+            is_([(diagnostic_uri, 2, 4)]),
+        )
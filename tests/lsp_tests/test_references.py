@@ -3,12 +3,14 @@
 import pytest
 from hamcrest import assert_that, is_in
 from lsprotocol.types import (
+    DidOpenTextDocumentParams,
     Location,
     Position,
     Range,
     ReferenceContext,
     ReferenceParams,
     TextDocumentIdentifier,
+    TextDocumentItem,
 )
 
 from tests import TEST_DATA
@@ -54,3 +56,42 @@ async def test_references():
 
         for loc in actual:
             assert_that(loc, is_in(expected))
+
+
+@pytest.mark.asyncio
+async def test_references_open_document():
+    """Test that unsaved changes of open documents are used for references"""
+
+    async with BibliClient(TEST_DATA) as client:
+        uri = as_uri(TEST_DATA / "reference_test_2.md")
+
+        client.text_document_did_open(
+            DidOpenTextDocumentParams(
+                TextDocumentItem(uri, "markdown", 1, "[@reference_test]\n")
+            )
+        )
+
+        actual = await client.text_document_references_async(
+            ReferenceParams(
+                context=ReferenceContext(False),
+                text_document=TextDocumentIdentifier(uri),
+                position=Position(line=0, character=2),
+            )
+        )
+        assert actual
+        expected = [
+            Location(
+                as_uri(TEST_DATA / "reference_test_1.md"),
+                Range(Position(2, 11), Position(2, 25)),
+            ),
+            Location(
+                as_uri(TEST_DATA / "reference_test_1.md"),
+                Range(Position(3, 11), Position(3, 25)),
+            ),
+            Location(uri, Range(Position(0, 1), Position(0, 15))),
+        ]
+
+        assert len(actual) == len(expected)
+
+        for loc in actual:
+            assert_that(loc, is_in(expected))
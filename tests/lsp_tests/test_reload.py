@@ -0,0 +1,81 @@
+"""Tests for reloading bibfiles changed on disk."""
+
+import asyncio
+import shutil
+
+import pytest
+from hamcrest import assert_that, is_, is_in, is_not
+from lsprotocol.types import (
+    CompletionParams,
+    DocumentDiagnosticParams,
+    Position,
+    TextDocumentIdentifier,
+)
+
+from tests import TEST_DATA
+from tests.client import BibliClient
+from tests.utils import as_uri
+
+
+@pytest.mark.asyncio
+async def test_reload_changed_bibfile(tmp_path):
+    """Test that an entry added to a bibfile is picked up without a reload"""
+
+    shutil.copytree(TEST_DATA, tmp_path, dirs_exist_ok=True)
+
+    async with BibliClient(tmp_path) as client:
+        uri = as_uri(tmp_path / "diagnostic_test.md")
+        params = DocumentDiagnosticParams(TextDocumentIdentifier(uri))
+
+        actual = await client.text_document_diagnostic_async(params)
+        assert_that(len(actual.items), is_(3))
+
+        with open(tmp_path / "references.bib", "a") as f:
+            f.write("\n@article{unknown1,\n  title = {title},\n}\n")
+
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            actual = await client.text_document_diagnostic_async(params)
+            if len(actual.items) == 2:
+                break
+
+        assert_that(
+            [d.message for d in actual.items],
+            is_(
+                [
+                    'Item "unknown2" does not exist in library',
+                    'Item "unknown3" does not exist in library',
+                ]
+            ),
+        )
+
+
+@pytest.mark.asyncio
+async def test_reload_updates_completion(tmp_path):
+    """Test that completion picks up an entry added to a bibfile"""
+
+    shutil.copytree(TEST_DATA, tmp_path, dirs_exist_ok=True)
+    (tmp_path / "completion_reload.md").write_text("[@unkno\n")
+
+    async with BibliClient(tmp_path) as client:
+        params = CompletionParams(
+            TextDocumentIdentifier(as_uri(tmp_path / "completion_reload.md")),
+            Position(line=0, character=7),
+        )
+
+        def labels(completion):
+            return [item.label for item in completion.items]
+
+        actual = await client.text_document_completion_async(params)
+        assert_that("@unknown1", is_not(is_in(labels(actual))))
+
+        with open(tmp_path / "references.bib", "a") as f:
+            f.write("\n@article{unknown1,\n  title = {title},\n}\n")
+
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            actual = await client.text_document_completion_async(params)
+            if "@unknown1" in labels(actual):
+                break
+
+        assert_that(labels(actual)[0], is_("@unknown1"))
@@ -0,0 +1,87 @@
+"""Tests for the SQLite storage engine."""
+
+import asyncio
+import os
+import shutil
+
+import pytest
+from hamcrest import assert_that, contains_string, is_
+from lsprotocol import types
+
+from tests import TEST_DATA
+from tests.client import BibliClient
+from tests.utils import as_uri
+
+CONFIG = """
+[storage]
+engine = "sqlite"
+
+[backends.bibfile]
+backend_type = "bibfile"
+bibfiles = ["references.bib", "references_other.bib"]
+cache = false
+watch = false
+"""
+
+
+def write_fifo(path: str, content: str):
+    # Blocks until the server reads the bibfile
+    with open(path, "w") as f:
+        f.write(content)
+
+
+async def complete(client: BibliClient, uri: str) -> list[str]:
+    actual = await client.text_document_completion_async(
+        types.CompletionParams(
+            types.TextDocumentIdentifier(uri),
+            types.Position(line=1, character=2),
+            types.CompletionContext(types.CompletionTriggerKind(2), "@"),
+        )
+    )
+    assert isinstance(actual, types.CompletionList)
+    return [item.label for item in actual.items]
+
+
+async def hover(client: BibliClient, uri: str) -> str:
+    actual = await client.text_document_hover_async(
+        types.HoverParams(
+            types.TextDocumentIdentifier(uri), types.Position(line=1, character=2)
+        )
+    )
+    assert actual
+    return str(actual)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_storage(tmp_path):
+    """Test that requests are answered from the store, and from the libraries
+    stored by the previous session while the backends load again"""
+
+    shutil.copytree(TEST_DATA, tmp_path, dirs_exist_ok=True)
+    (tmp_path / ".bibli.toml").write_text(CONFIG)
+    completion_uri = as_uri(tmp_path / "completion_test.md")
+    hover_uri = as_uri(tmp_path / "definition_test.md")
+    expected = ["@test1", "@test2", "@test3", "@reference_test"]
+
+    async with BibliClient(tmp_path) as client:
+        assert_that(await complete(client, completion_uri), is_(expected))
+        assert_that(await hover(client, hover_uri), contains_string("john_snow"))
+
+    assert (tmp_path / ".bibli" / "library.sqlite3").exists()
+
+    # Reading the bibfile blocks until it is written to
+    content = (tmp_path / "references.bib").read_text()
+    os.remove(tmp_path / "references.bib")
+    os.mkfifo(tmp_path / "references.bib")
+
+    client = BibliClient(tmp_path, wait_for_libraries=False)
+    async with client:
+        assert_that(await complete(client, completion_uri), is_(expected))
+        assert_that(await hover(client, hover_uri), contains_string("john_snow"))
+        assert_that(client.libraries_loaded.is_set(), is_(False))
+
+        await asyncio.get_running_loop().run_in_executor(
+            None, write_fifo, str(tmp_path / "references.bib"), content
+        )
+        await asyncio.wait_for(client.libraries_loaded.wait(), 10)
+        assert_that(await complete(client, completion_uri), is_(expected))
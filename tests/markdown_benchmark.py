@@ -0,0 +1,84 @@
+"""Compare rendering the `list` documentation format natively and with mdformat.
+
+Run with `python -m tests.markdown_benchmark [entries]`.
+"""
+
+import sys
+import time
+from typing import Any, Callable
+
+import mdformat
+
+from bibli_ls.bibli_config import DEFAULT_WRAP, DocFormatingConfig
+from bibli_ls.markdown import render_list_doc
+
+
+def make_entries(n: int) -> list[tuple[dict[str, Any], dict[str, Any]]]:
+    """`n` plain text entries with the fields of a typical Zotero export, as
+    `(field_dict, show_field_dict)`"""
+    entries = []
+    for i in range(n):
+        show_field_dict = {
+            "title": f"On the {i}th Problem of Large Libraries",
+            "volume": str(i % 40),
+            "issn": f"1234-{i % 10000:04d}",
+            "url": f"https://example.org/articles/{i}",
+            "doi": f"10.1000/example.{i}",
+            "abstract": f"We study problem number {i} in great detail, with "
+            "results that hold for libraries of any size and shape.",
+            "journal": "Journal of Examples",
+            "author": f"Author, Ann{i} and Writer, Bob",
+            "year": str(1990 + i % 35),
+            "pages": f"{i}--{i + 10}",
+        }
+        entries.append((show_field_dict | {"entry_type": "article"}, show_field_dict))
+    return entries
+
+
+def render_with_mdformat(
+    header_format: str, field_dict: dict[str, Any], show_field_dict: dict[str, Any]
+) -> str:
+    """The `list` format as rendered when an entry needs mdformat"""
+    doc_string = header_format.format(**field_dict) + "\n"
+    for k, v in show_field_dict.items():
+        doc_string += f"- __{k}__: {v}\n"
+    return mdformat.text(doc_string, options={"wrap": DEFAULT_WRAP})
+
+
+def time_per_entry(render: Callable[[], Any], n: int) -> float:
+    """Seconds `render` takes per entry"""
+    start = time.perf_counter()
+    render()
+    return (time.perf_counter() - start) / n
+
+
+def measure(n: int) -> tuple[float, float]:
+    """Seconds per entry to render `n` entries natively and with mdformat"""
+    header_format = DocFormatingConfig().header_format
+    if isinstance(header_format, list):
+        header_format = "\n".join(header_format)
+    entries = make_entries(n)
+
+    # Warm up the caches of both renderers
+    render_with_mdformat(header_format, *entries[0])
+    assert render_list_doc(header_format, *entries[0], DEFAULT_WRAP) is not None
+
+    native = time_per_entry(
+        lambda: [
+            render_list_doc(header_format, *entry, DEFAULT_WRAP) for entry in entries
+        ],
+        n,
+    )
+    formatted = time_per_entry(
+        lambda: [render_with_mdformat(header_format, *entry) for entry in entries],
+        n,
+    )
+    return native, formatted
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    native, formatted = measure(n)
+    print(f"Native:   {native * 1e6:8.1f} us per entry")
+    print(f"mdformat: {formatted * 1e6:8.1f} us per entry")
+    print(f"Speedup:  {formatted / native:8.1f}")
@@ -0,0 +1,68 @@
+"""Compare the memory held by bibtexparser's `Library` and `BibliLibrary`.
+
+Run with `python -m tests.memory_benchmark [entries]`.
+"""
+
+import gc
+import sys
+import tracemalloc
+from typing import Any, Callable
+
+import bibtexparser
+
+from bibli_ls.database import BibliLibrary
+
+
+def make_bibtex(n: int) -> str:
+    """`n` entries with the fields of a typical Zotero export"""
+    entries = []
+    for i in range(n):
+        entries.append(
+            f"@article{{author{i}2020,\n"
+            f"\ttitle = {{On the {i}th Problem of Large Libraries}},\n"
+            f"\tvolume = {{{i % 40}}},\n"
+            f"\tissn = {{1234-{i % 10000:04d}}},\n"
+            f"\turl = {{https://example.org/articles/{i}}},\n"
+            f"\tdoi = {{10.1000/example.{i}}},\n"
+            f"\tabstract = {{We study problem number {i} in great detail.}},\n"
+            f"\tnumber = {{{i % 12}}},\n"
+            f"\tjournal = {{Journal of Examples}},\n"
+            f"\tauthor = {{Author, Ann{i} and Writer, Bob}},\n"
+            f"\tyear = {{{1990 + i % 35}}},\n"
+            f"\tpages = {{{i}--{i + 10}}},\n"
+            f"\tkeywords = {{examples, libraries}},\n"
+            "}\n"
+        )
+    return "\n".join(entries)
+
+
+def retained_size(build: Callable[[], Any]) -> int:
+    """Bytes allocated by `build` and still held by the object it returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def measure(n: int) -> tuple[int, int]:
+    """Bytes held by `n` entries parsed into a `Library` and a `BibliLibrary`"""
+    content = make_bibtex(n)
+    library_size = retained_size(lambda: bibtexparser.parse_string(content))
+    compact_size = retained_size(
+        lambda: BibliLibrary(bibtexparser.parse_string(content).blocks)
+    )
+    return library_size, compact_size
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    library_size, compact_size = measure(n)
+    print(f"Library:      {library_size / n:8.0f} bytes per entry")
+    print(f"BibliLibrary: {compact_size / n:8.0f} bytes per entry")
+    print(f"Ratio:        {compact_size / library_size:8.2f}")
@@ -0,0 +1,139 @@
+"""Test looking up attachments through Better BibTeX."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from hamcrest import assert_that, is_
+
+from bibli_ls.better_bibtex import BetterBibTeXClient
+
+
+class BetterBibTeXHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "BetterBibTeXServer"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.client_address, payload))
+
+        body = []
+        for call in payload:
+            (citekey,) = call["params"]
+            if citekey in self.server.attachments:
+                result = [{"open": uri} for uri in self.server.attachments[citekey]]
+                body.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+            else:
+                error = {"code": -32603, "message": f"{citekey} not found"}
+                body.append({"jsonrpc": "2.0", "id": call["id"], "error": error})
+
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BetterBibTeXServer(ThreadingHTTPServer):
+    def __init__(self, attachments: dict[str, list[str]]):
+        super().__init__(("127.0.0.1", 0), BetterBibTeXHandler)
+        self.attachments = attachments
+        self.requests = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/better-bibtex/json-rpc"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+ATTACHMENTS = {
+    "smith2020": ["zotero://open-pdf/library/items/A"],
+    "doe2021": ["zotero://open-pdf/library/items/B"],
+    "empty2022": [],
+}
+
+
+def test_batched_and_cached():
+    """Test that attachments are looked up in one request over one connection
+    and then reused"""
+
+    with BetterBibTeXServer(ATTACHMENTS) as server:
+        client = BetterBibTeXClient(server.url)
+
+        uri = client.get_attachment_uri("smith2020", ["doe2021", "empty2022"])
+        assert_that(uri, is_("zotero://open-pdf/library/items/A"))
+        assert_that(len(server.requests), is_(1))
+
+        # Prefetched
+        uri = client.get_attachment_uri("doe2021")
+        assert_that(uri, is_("zotero://open-pdf/library/items/B"))
+        assert_that(client.get_attachment_uri("empty2022"), is_(None))
+        assert_that(len(server.requests), is_(1))
+
+        assert_that(client.get_attachment_uri("unknown"), is_(None))
+        client.clear()
+        client.get_attachment_uri("smith2020")
+        assert_that(len(server.requests), is_(3))
+
+        # The connection was kept alive
+        addresses = {address for address, _ in server.requests}
+        assert_that(len(addresses), is_(1))
+
+
+def test_concurrent_lookups(monkeypatch):
+    """Test that concurrent lookups share one session"""
+
+    sessions = []
+
+    class Session(requests.Session):
+        def __init__(self):
+            super().__init__()
+            sessions.append(self)
+
+    monkeypatch.setattr(requests, "Session", Session)
+
+    with BetterBibTeXServer(ATTACHMENTS) as server:
+        client = BetterBibTeXClient(server.url, ttl=0)
+        threads = [
+            threading.Thread(target=client.get_attachment_uri, args=["smith2020"])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(len(server.requests), is_(8))
+        assert_that(len(sessions), is_(1))
+
+
+def test_expired():
+    with BetterBibTeXServer(ATTACHMENTS) as server:
+        client = BetterBibTeXClient(server.url, ttl=0)
+        client.get_attachment_uri("smith2020")
+        client.get_attachment_uri("smith2020")
+        assert_that(len(server.requests), is_(2))
+
+
+def test_unreachable():
+    """Test that failing to reach Zotero is not an error, and not cached"""
+
+    with BetterBibTeXServer(ATTACHMENTS) as server:
+        url = server.url
+
+    client = BetterBibTeXClient(url, timeout=0.5)
+    assert_that(client.get_attachment_uri("smith2020"), is_(None))
+    assert_that(client._attachments, is_({}))
@@ -0,0 +1,129 @@
+"""Test parsing a bibfile in chunks."""
+
+import bibtexparser
+from bibtexparser.library import Library
+from hamcrest import assert_that, is_
+
+from bibli_ls.backends.bibtex_splitter import (
+    find_key_span,
+    merge_chunks,
+    parse_bibtex_chunk,
+    record_key_spans,
+    split_bibfile,
+)
+from bibli_ls.database import KEY_SPAN
+
+BIBFILE = """% A comment with an unbalanced { brace
+@string{conf = "Conference on Things"}
+
+@article{first,
+  author = {someone},
+  title = {Title with {Braces}
+    and a @ at the start of a line},
+  booktitle = conf,
+}
+
+@comment{not an entry}
+
+@inproceedings{second,
+  booktitle = conf # " 2024",
+  year = 2024,
+}
+
+@article{first,
+  title = {Duplicate},
+}
+
+@string{late = "Defined after use"}
+
+@misc{third, note = late}
+"""
+
+
+def describe(blocks):
+    # Line numbers of chunked blocks are relative to their chunk, lines are
+    # compared through the key spans
+    return [
+        (
+            type(block).__name__,
+            getattr(block, "key", None),
+            [(f.key, f.value) for f in getattr(block, "fields", [])],
+            block.get_parser_metadata(KEY_SPAN),
+        )
+        for block in blocks
+    ]
+
+
+def test_split_bibfile(tmp_path):
+    """Test that chunks are only cut at top-level blocks"""
+
+    bibfile = tmp_path / "test.bib"
+    bibfile.write_text(BIBFILE)
+
+    bounds = list(split_bibfile(str(bibfile), 1))
+    starts = [BIBFILE.splitlines()[line] for _, _, line in bounds]
+    assert_that(
+        starts,
+        is_(
+            [
+                "% A comment with an unbalanced { brace",
+                '@string{conf = "Conference on Things"}',
+                "@article{first,",
+                "@comment{not an entry}",
+                "@inproceedings{second,",
+                "@article{first,",
+                '@string{late = "Defined after use"}',
+                "@misc{third, note = late}",
+            ]
+        ),
+    )
+    assert_that(sum(length for _, length, _ in bounds), is_(len(BIBFILE)))
+
+
+def test_chunked_parse_matches_whole_parse(tmp_path):
+    """Test that merging chunks gives the same library as a whole-file parse"""
+
+    bibfile = tmp_path / "test.bib"
+    bibfile.write_text(BIBFILE)
+
+    chunks = [
+        parse_bibtex_chunk(str(bibfile), *bound)
+        for bound in split_bibfile(str(bibfile), 1)
+    ]
+    actual = merge_chunks(chunks)
+    expected = bibtexparser.parse_string(BIBFILE).blocks
+    record_key_spans(expected, BIBFILE)
+
+    assert_that(describe(actual), is_(describe(expected)))
+
+
+def test_key_spans(tmp_path):
+    """Test that the exact declaration of each key is recorded"""
+
+    bibfile = tmp_path / "test.bib"
+    bibfile.write_text(BIBFILE + "  @book{ indented,\n}\n@book{\n  next_line,\n}\n")
+
+    chunks = [
+        parse_bibtex_chunk(str(bibfile), *bound)
+        for bound in split_bibfile(str(bibfile), 1)
+    ]
+    library = Library(merge_chunks(chunks))
+
+    spans = {
+        key: entry.get_parser_metadata(KEY_SPAN)
+        for key, entry in library.entries_dict.items()
+    }
+    assert_that(
+        spans,
+        is_(
+            {
+                "first": (3, 9, 14),
+                "second": (12, 15, 21),
+                "third": (23, 6, 11),
+                "indented": (24, 9, 17),
+                "next_line": (27, 2, 11),
+            }
+        ),
+    )
+    assert_that(find_key_span(str(bibfile), "first"), is_((3, 9, 14)))
+    assert_that(find_key_span(str(bibfile), "next_line"), is_(None))
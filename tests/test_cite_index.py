@@ -0,0 +1,49 @@
+"""Test the citation index of the workspace."""
+
+import threading
+
+from hamcrest import assert_that, is_
+
+from bibli_ls import cite_index
+from bibli_ls.bibli_config import CiteConfig
+from bibli_ls.cite_index import CiteIndex
+
+
+def cited_paths(index: CiteIndex, key: str) -> list[str]:
+    return [location.uri.rsplit("/", 1)[-1] for location in index.find(key, {})]
+
+
+def test_ignored_directories(tmp_path):
+    """Test that changed files are only indexed where `build` looks for them"""
+
+    for d in ["notes", "node_modules", ".hidden"]:
+        (tmp_path / d).mkdir()
+    (tmp_path / "notes" / "a.md").write_text("[@smith2020]\n")
+
+    index = CiteIndex(CiteConfig(), [".md"])
+    index.build(str(tmp_path))
+    assert_that(cited_paths(index, "smith2020"), is_(["a.md"]))
+
+    for d in ["notes", "node_modules", ".hidden"]:
+        path = tmp_path / d / "b.md"
+        path.write_text("[@smith2020]\n")
+        index.invalidate_path(str(path))
+    assert_that(cited_paths(index, "smith2020"), is_(["a.md", "b.md"]))
+
+
+def test_failed_build(tmp_path, monkeypatch):
+    """Test that lookups do not wait forever for a scan that failed"""
+
+    (tmp_path / "a.md").write_text("[@smith2020]\n")
+
+    def fail(*args):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(cite_index, "find_occurrences", fail)
+    index = CiteIndex(CiteConfig(), [".md"])
+    index.build_in_background(str(tmp_path))
+
+    thread = threading.Thread(target=index.find, args=["smith2020", {}], daemon=True)
+    thread.start()
+    thread.join(5)
+    assert_that(thread.is_alive(), is_(False))
@@ -0,0 +1,65 @@
+"""Test ranking completion items."""
+
+from hamcrest import assert_that, is_
+from lsprotocol import types
+
+from bibli_ls.bibli_config import CiteConfig
+from bibli_ls.completion_index import CompletionIndex
+from bibli_ls.parse import cite_prefix_at_position
+
+ENTRIES = [
+    ("smith2020", "Smith, John", "Deep learning"),
+    ("doe99", "Doe, Jane", "Learning to cite"),
+    ("SmithJones", "Smith, Anna", "Citations"),
+    ("asmith", "Smith, Bob", "Other"),
+    ("sxmxixtxh", "X", "Y"),
+]
+
+
+def build_index():
+    return CompletionIndex(
+        [types.CompletionItem("@" + key) for key, _, _ in ENTRIES],
+        [key for key, _, _ in ENTRIES],
+        [f"{author} {title}" for _, author, title in ENTRIES],
+    )
+
+
+def labels(items: list[types.CompletionItem]):
+    return [item.label for item in items]
+
+
+def test_ranking():
+    """Test that prefix matches come before substring, text and fuzzy ones"""
+
+    index = build_index()
+    items = index.search("smith", 10)
+    assert_that(
+        labels(items),
+        is_(["@smith2020", "@SmithJones", "@asmith", "@sxmxixtxh"]),
+    )
+    assert_that(
+        [i.sort_text for i in items], is_(["00000", "00001", "00002", "00003"])
+    )
+    # Not starting with the query, but should not be dropped by the client
+    assert_that(items[2].filter_text, is_("@smith"))
+
+    assert_that(labels(index.search("learning", 10)), is_(["@smith2020", "@doe99"]))
+
+
+def test_limit():
+    """Test that results are capped"""
+
+    index = build_index()
+    assert_that(labels(index.search("smith", 2)), is_(["@smith2020", "@SmithJones"]))
+    assert_that(len(index.search("", 3)), is_(3))
+    assert_that(len(index.search("", 0)), is_(5))
+
+
+def test_cite_prefix_at_position():
+    """Test finding the part of a citekey typed before the cursor"""
+
+    cite = CiteConfig()
+    assert_that(cite_prefix_at_position("see [@smi", 9, cite), is_("smi"))
+    assert_that(cite_prefix_at_position("see [@smith; @", 14, cite), is_(""))
+    assert_that(cite_prefix_at_position("[@smith; ", 9, cite), is_(""))
+    assert_that(cite_prefix_at_position("no cite", 7, cite), is_(""))
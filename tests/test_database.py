@@ -0,0 +1,101 @@
+"""Test the citekey index of the database."""
+
+import bibtexparser
+from hamcrest import assert_that, is_, less_than
+
+from bibli_ls.database import BibliBibDatabase, BibliLibrary
+from tests.memory_benchmark import measure
+
+
+def make_library(bibtex: str, path: str) -> BibliLibrary:
+    return BibliLibrary(bibtexparser.parse_string(bibtex).blocks, path)
+
+
+def test_index_precedence():
+    """Test that the first backend defining a key wins and others are shadowed"""
+
+    lib1 = make_library("@book{a, title={A1}}\n@book{b, title={B1}}", "one.bib")
+    lib2 = make_library("@book{a, title={A2}}\n@book{c, title={C2}}", "two.bib")
+    lib3 = make_library("@book{c, title={C3}}", "three.bib")
+
+    db = BibliBibDatabase()
+    db.set_libraries("first", [lib1, lib2])
+    db.set_libraries("second", [lib3])
+
+    assert_that(db.find_in_libraries("a")[1], is_(lib1))
+    assert_that(db.find_in_libraries("b")[1], is_(lib1))
+    assert_that(db.find_in_libraries("c")[1], is_(lib2))
+    assert_that(db.find_in_libraries("d"), is_((None, None)))
+
+    assert_that([lib for _, lib in db.shadowed["a"]], is_([lib2]))
+    assert_that([lib for _, lib in db.shadowed["c"]], is_([lib3]))
+
+
+def test_index_reload():
+    """Test that reloading a backend updates the index but keeps precedence"""
+
+    lib1 = make_library("@book{a, title={A1}}", "one.bib")
+    lib2 = make_library("@book{a, title={A2}}", "two.bib")
+
+    db = BibliBibDatabase()
+    db.set_libraries("first", [lib1])
+    db.set_libraries("second", [lib2])
+
+    reloaded = make_library("@book{b, title={B1}}", "one.bib")
+    db.set_libraries("first", [reloaded])
+
+    assert_that(db.find_in_libraries("a")[1], is_(lib2))
+    assert_that(db.find_in_libraries("b")[1], is_(reloaded))
+    assert_that(db.shadowed, is_({}))
+
+
+def test_generations():
+    """Test that only the changed backend and libraries get a new generation"""
+
+    lib1 = make_library("@book{a, title={A1}}", "one.bib")
+    lib2 = make_library("@book{b, title={B1}}", "two.bib")
+    lib3 = make_library("@book{c, title={C1}}", "three.bib")
+
+    db = BibliBibDatabase()
+    db.set_libraries("first", [lib1, lib2])
+    db.set_libraries("second", [lib3])
+    assert_that(db.generation, is_(2))
+    assert_that(db.generations, is_({"first": 1, "second": 2}))
+
+    reloaded = make_library("@book{b, title={B2}}", "two.bib")
+    db.set_libraries("first", [lib1, reloaded])
+
+    assert_that(db.generation, is_(3))
+    assert_that(db.generations, is_({"first": 3, "second": 2}))
+    assert_that(
+        [lib.generation for lib in [lib1, reloaded, lib3]], is_([1, 3, 2])
+    )
+
+
+def test_compact_entries():
+    """Test that entries keep their fields, in order, once compacted"""
+
+    library = make_library(
+        "@book{a, title={A1}, note={N}, author={X}}\n"
+        "@article{b, note={M}}\n"
+        "@book{a, title={Duplicate}}",
+        "one.bib",
+    )
+
+    assert_that(list(library.entries_dict), is_(["a", "b"]))
+    a, b = library.entries
+    assert_that(a.entry_type, is_("book"))
+    assert_that(
+        list(a.items()), is_([("title", "A1"), ("note", "N"), ("author", "X")])
+    )
+    assert_that(list(b.items()), is_([("note", "M")]))
+    assert_that("title" in b, is_(False))
+    assert_that((b.get("title"), b.get("note")), is_((None, "M")))
+    assert_that(a.fields_dict["title"].value, is_("A1"))
+
+
+def test_compact_memory():
+    """Test that compact entries take a fraction of the memory of bibtexparser's"""
+
+    library_size, compact_size = measure(1000)
+    assert_that(compact_size, less_than(library_size / 2))
@@ -0,0 +1,72 @@
+"""Test caching rendered documentation."""
+
+import bibtexparser
+from hamcrest import assert_that, is_
+
+from bibli_ls.bibli_config import DocFormatingConfig
+from bibli_ls.database import BibliBibDatabase, BibliLibrary
+from bibli_ls.doc_cache import DocStringCache, LRUCache
+
+
+def test_lru_eviction():
+    """Test that the least recently used value is dropped first"""
+
+    cache = LRUCache(2)
+    cache.get_or_compute("a", lambda: "A")
+    cache.get_or_compute("b", lambda: "B")
+    cache.get_or_compute("a", lambda: "unused")
+    cache.get_or_compute("c", lambda: "C")
+
+    assert_that(cache.get_or_compute("a", lambda: "A2"), is_("A"))
+    assert_that(cache.get_or_compute("b", lambda: "B2"), is_("B2"))
+    assert_that((cache.hits, cache.misses, len(cache)), is_((2, 4, 2)))
+
+
+def test_doc_cache_keys():
+    """Test that documentation is rendered again for a new generation or
+    formatting config only"""
+
+    db = BibliBibDatabase()
+    library = BibliLibrary(
+        bibtexparser.parse_string("@book{a, title={Old}}").blocks, "one.bib"
+    )
+    db.set_libraries("bib", [library])
+
+    cache = DocStringCache()
+    config = DocFormatingConfig(format="table")
+    entry, library = db.find_in_libraries("a")
+    assert entry and library
+    assert "Old" in cache.get("a", entry, library, config)
+    assert "Old" in cache.get("a", entry, library, config)
+    cache.get("a", entry, library, DocFormatingConfig(format="table", wrap=10))
+    assert_that((cache.hits, cache.misses), is_((1, 2)))
+
+    reloaded = BibliLibrary(
+        bibtexparser.parse_string("@book{a, title={New}}").blocks, "one.bib"
+    )
+    db.set_libraries("bib", [reloaded])
+    entry, library = db.find_in_libraries("a")
+    assert entry and library
+    assert "New" in cache.get("a", entry, library, config)
+
+
+def test_render_keeps_entry():
+    """Test that rendering does not truncate or clean up the stored entry"""
+
+    title = "A {{Long}} title\nover two lines"
+    library = BibliLibrary(
+        bibtexparser.parse_string("@book{a, title={" + title + "}}").blocks,
+        "one.bib",
+    )
+    entry = library.entries_dict["a"]
+
+    cache = DocStringCache()
+    short = cache.get("a", entry, library, DocFormatingConfig(character_limit=8))
+    full = cache.get("a", entry, library, DocFormatingConfig(character_limit=100))
+
+    assert_that(entry.fields_dict["title"].value, is_(title))
+    assert_that(
+        library.display_fields["a"]["title"], is_("A Long title over two lines")
+    )
+    assert "A Long t..." in short
+    assert "A Long title over two lines" in full
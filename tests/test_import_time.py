@@ -0,0 +1,46 @@
+"""Test that startup only imports what it needs."""
+
+import subprocess
+import sys
+
+from hamcrest import assert_that, empty, is_
+
+from tests import PROJECT_ROOT
+
+"""Packages only needed by some configs, or to serve"""
+SERVER_LAZY_IMPORTS = ["requests", "mdformat", "py_markdown_table"]
+VERSION_LAZY_IMPORTS = SERVER_LAZY_IMPORTS + ["pygls", "lsprotocol", "bibtexparser"]
+
+
+def imported_modules(*args: str) -> list[str]:
+    """Modules imported by running python with `args`, from `-X importtime`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert_that(result.returncode, is_(0))
+    return [
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    ]
+
+
+def lazy_imports(modules: list[str], packages: list[str]) -> list[str]:
+    return [m for m in modules if m.split(".")[0] in packages]
+
+
+def test_version_import_budget():
+    """Test that `--version` does not load the server"""
+
+    modules = imported_modules("bibli_ls/cli.py", "--version")
+    assert_that(lazy_imports(modules, VERSION_LAZY_IMPORTS), is_(empty()))
+
+
+def test_server_import_budget():
+    """Test that the server loads backends and formatters only when used"""
+
+    modules = imported_modules("-c", "import bibli_ls.server")
+    assert_that(lazy_imports(modules, SERVER_LAZY_IMPORTS), is_(empty()))
@@ -0,0 +1,64 @@
+"""Test diagnosing only the changed lines of a document."""
+
+import random
+
+from hamcrest import assert_that, is_
+from lsprotocol import types
+from pygls.workspace import TextDocument
+
+from bibli_ls.server import SERVER
+
+URI = "file:///incremental.md"
+
+SOURCE = """# Notes
+
+[@missing1] and [@missing2; @missing3]
+some text
+@missing4 at the start
+
+trailing [@missing5]
+"""
+
+SNIPPETS = ["", "\n", "@new", " [@other]\n", "x", "\n\n@a\n", "[@b; @c] d"]
+
+
+def full_diagnostics(source: str):
+    document = TextDocument(URI + ".full", source)
+    SERVER.diagnose(document)
+    return SERVER.diagnostics[document.uri][1]
+
+
+def random_change(document: TextDocument, rng: random.Random):
+    lines = document.source.split("\n")
+
+    def position():
+        line = rng.randrange(len(lines))
+        return types.Position(line, rng.randrange(len(lines[line]) + 1))
+
+    start, end = sorted([position(), position()], key=lambda p: (p.line, p.character))
+    return types.TextDocumentContentChangePartial(
+        range=types.Range(start, end), text=rng.choice(SNIPPETS)
+    )
+
+
+def test_incremental_diagnostics_match_full(caplog):
+    """Test that incremental diagnostics equal a full re-scan after random edits"""
+
+    rng = random.Random(0)
+    document = TextDocument(URI, SOURCE, version=0)
+    SERVER.diagnose(document)
+
+    for version in range(1, 200):
+        changes = []
+        for _ in range(rng.randint(1, 3)):
+            change = random_change(document, rng)
+            document.apply_change(change)
+            changes.append(change)
+        document.version = version
+
+        SERVER.diagnose_changes(document, changes)
+
+        actual = SERVER.diagnostics[URI][1]
+        assert_that(actual, is_(full_diagnostics(document.source)))
+
+    assert "Out of sync" not in caplog.text
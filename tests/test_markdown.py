@@ -0,0 +1,72 @@
+"""Test rendering the list documentation format natively."""
+
+import random
+import string
+
+import mdformat
+from hamcrest import assert_that, is_, none
+
+from bibli_ls.markdown import render_list_doc
+
+HEADER_FORMATS = [
+    "# `{entry_type}` {title}\n\n_{author}_",
+    "## {title}\n{author} ({year})",
+    "**{author}**: {title}",
+]
+
+
+def render_with_mdformat(header_format, field_dict, show_field_dict, wrap):
+    doc_string = header_format.format(**field_dict) + "\n"
+    for k, v in show_field_dict.items():
+        doc_string += f"- __{k}__: {v}\n"
+    return mdformat.text(doc_string, options={"wrap": wrap})
+
+
+def test_native_matches_mdformat():
+    """Test that natively rendered entries are formatted exactly like mdformat
+    formats them"""
+
+    rng = random.Random(0)
+    alphabet = string.ascii_letters * 4 + string.digits + " " * 20 + "_-.,:;()*[&é"
+
+    def text(n):
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(1, n)))
+
+    native = 0
+    for _ in range(500):
+        header_format = rng.choice(HEADER_FORMATS)
+        field_dict = {
+            "entry_type": rng.choice(["article", "book"]),
+            "title": text(60),
+            "author": text(30),
+            "year": text(4),
+        }
+        show_field_dict = {k: text(120) for k in ["journal", "abstract"]}
+        wrap = rng.choice([40, 80])
+
+        actual = render_list_doc(header_format, field_dict, show_field_dict, wrap)
+        if actual is not None:
+            native += 1
+            expected = render_with_mdformat(
+                header_format, field_dict, show_field_dict, wrap
+            )
+            assert_that(actual, is_(expected))
+
+    # Enough random entries contain no markup to be rendered natively
+    assert native > 25
+
+
+def test_markup_falls_back():
+    """Test that entries with markdown markup are left to mdformat"""
+
+    header_format = HEADER_FORMATS[0]
+    field_dict = {"entry_type": "article", "title": "Title", "author": "Doe"}
+    assert_that(
+        render_list_doc(header_format, field_dict, {"note": "plain words"}, 80),
+        is_("# `article` Title\n\n_Doe_\n\n- __note__: plain words\n"),
+    )
+    for value in ["*emphasis*", "[link]", "&amp;", "_under_"]:
+        assert_that(
+            render_list_doc(header_format, field_dict, {"note": value}, 80),
+            none(),
+        )
@@ -0,0 +1,55 @@
+"""Test scanning citations."""
+
+from hamcrest import assert_that, is_
+
+from bibli_ls.bibli_config import CiteConfig
+from bibli_ls.parse import find_cites
+
+
+def scan(text: str):
+    return [
+        (c.key, c.start, c.end, c.suppress_author, c.bracketed, c.prefix, c.locator)
+        for c in find_cites(text, CiteConfig())
+    ]
+
+
+def test_citation_blocks():
+    """Test prefixes, locators and suppressed authors in citation blocks"""
+
+    text = "Blah [see -@doe99, pp. 33-35; also @smith04, chap. 1; @{odd key}]."
+    assert_that(
+        scan(text),
+        is_(
+            [
+                ("doe99", 11, 17, True, True, "see", "pp. 33-35"),
+                ("smith04", 35, 43, False, True, "also", "chap. 1"),
+                ("odd key", 54, 64, False, True, "", ""),
+            ]
+        ),
+    )
+
+
+def test_in_text_citations():
+    """Test in-text citations, with and without a locator"""
+
+    assert_that(
+        scan("@doe99 [p. 33] says @smith04:intro, or @a.b."),
+        is_(
+            [
+                ("doe99", 0, 6, False, False, "", "p. 33"),
+                ("smith04:intro", 20, 34, False, False, "", ""),
+                ("a.b", 39, 43, False, False, "", ""),
+            ]
+        ),
+    )
+    assert_that(scan("[@doe99] non-@x"), is_([("doe99", 1, 7, False, True, "", "")]))
+
+
+def test_emails_are_not_citations():
+    """Test that a trigger inside a word is not a citation"""
+
+    assert_that(scan("mail hello@world.com or first.last-x@a.org"), is_([]))
+    assert_that(
+        [c.key for c in find_cites("hello@world.com [@key]", CiteConfig())],
+        is_(["key"]),
+    )
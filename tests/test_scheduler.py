@@ -0,0 +1,104 @@
+"""Test debouncing and coalescing diagnostics."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from hamcrest import assert_that, is_
+from lsprotocol import types
+from pygls.workspace import TextDocument
+
+from bibli_ls.scheduler import DiagnosticsScheduler
+
+URI = "file:///scheduled.md"
+
+
+def insert(text: str):
+    return types.TextDocumentContentChangePartial(
+        range=types.Range(types.Position(0, 0), types.Position(0, 0)), text=text
+    )
+
+
+class Recorder:
+    def __init__(self, document: TextDocument, block: threading.Event | None = None):
+        self.document = document
+        self.block = block
+        self.diagnosed: list[tuple[int | None, list | None]] = []
+        self.published: list[int | None] = []
+        self.executor = ThreadPoolExecutor()
+
+    def scheduler(self, delay: float) -> DiagnosticsScheduler:
+        return DiagnosticsScheduler(
+            get_document=lambda uri: self.document if uri == URI else None,
+            diagnose=self.diagnose,
+            publish=lambda uri: self.published.append(self.document.version),
+            executor=lambda: self.executor,
+            delay=delay,
+        )
+
+    def diagnose(self, document: TextDocument, changes):
+        if self.block:
+            self.block.wait()
+        self.diagnosed.append(
+            (document.version, changes if changes is None else list(changes))
+        )
+
+    def change(self, scheduler: DiagnosticsScheduler, text: str):
+        change = insert(text)
+        self.document.apply_change(change)
+        self.document.version = (self.document.version or 0) + 1
+        scheduler.schedule(URI, [change])
+        return change
+
+
+@pytest.mark.asyncio
+async def test_changes_are_coalesced():
+    """Test that a burst of changes is diagnosed and published once"""
+
+    recorder = Recorder(TextDocument(URI, "", version=0))
+    scheduler = recorder.scheduler(0.05)
+    scheduler.attach(asyncio.get_running_loop())
+
+    changes = [recorder.change(scheduler, c) for c in "abc"]
+    await asyncio.sleep(0.2)
+
+    assert_that(recorder.diagnosed, is_([(3, changes)]))
+    assert_that(recorder.published, is_([3]))
+
+
+@pytest.mark.asyncio
+async def test_full_diagnosis_absorbs_changes():
+    """Test that changes pending with a full diagnosis are not replayed"""
+
+    recorder = Recorder(TextDocument(URI, "", version=0))
+    scheduler = recorder.scheduler(0.05)
+    scheduler.attach(asyncio.get_running_loop())
+
+    recorder.change(scheduler, "a")
+    scheduler.schedule(URI)
+    recorder.change(scheduler, "b")
+    await asyncio.sleep(0.2)
+
+    assert_that(recorder.diagnosed, is_([(2, None)]))
+
+
+@pytest.mark.asyncio
+async def test_stale_diagnostics_are_not_published():
+    """Test that changes made during a diagnosis are diagnosed after it, and
+    only the latest version is published"""
+
+    block = threading.Event()
+    recorder = Recorder(TextDocument(URI, "", version=0), block)
+    scheduler = recorder.scheduler(0.01)
+    scheduler.attach(asyncio.get_running_loop())
+
+    first = recorder.change(scheduler, "a")
+    await asyncio.sleep(0.05)
+    second = recorder.change(scheduler, "b")
+    await asyncio.sleep(0.05)
+    block.set()
+    await asyncio.sleep(0.1)
+
+    assert_that(recorder.diagnosed, is_([(1, [first]), (2, [second])]))
+    assert_that(recorder.published, is_([2]))
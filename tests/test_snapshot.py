@@ -0,0 +1,49 @@
+"""Test the on-disk snapshots of parsed bibfiles."""
+
+import bibtexparser
+from hamcrest import assert_that, is_, none
+
+from bibli_ls.snapshot import (
+    get_snapshot_path,
+    load_snapshot,
+    save_snapshot,
+    snapshot_key,
+)
+
+
+def write_bibfile(path, content):
+    path.write_text(content)
+    return str(path), content
+
+
+def test_snapshot_roundtrip(tmp_path, monkeypatch):
+    """Test that a snapshot is only used while the bibfile is unchanged"""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    bibfile, content = write_bibfile(tmp_path / "a.bib", "@book{a, title={A}}")
+
+    key = snapshot_key(bibfile)
+    assert_that(load_snapshot(bibfile, key), is_(none()))
+
+    save_snapshot(bibfile, key, bibtexparser.parse_string(content).blocks)
+    blocks = load_snapshot(bibfile, key)
+    assert blocks
+    assert_that(blocks[0].key, is_("a"))
+    assert_that(blocks[0]["title"], is_("A"))
+
+    bibfile, content = write_bibfile(tmp_path / "a.bib", "@book{b, title={B}}")
+    assert_that(load_snapshot(bibfile, snapshot_key(bibfile)), is_(none()))
+
+
+def test_corrupted_snapshot(tmp_path, monkeypatch):
+    """Test that a corrupted snapshot is ignored"""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    bibfile, content = write_bibfile(tmp_path / "a.bib", "@book{a, title={A}}")
+    key = snapshot_key(bibfile)
+    save_snapshot(bibfile, key, bibtexparser.parse_string(content).blocks)
+
+    with open(get_snapshot_path(bibfile), "wb") as f:
+        f.write(b"garbage")
+
+    assert_that(load_snapshot(bibfile, key), is_(none()))
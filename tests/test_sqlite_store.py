@@ -0,0 +1,144 @@
+"""Test the SQLite library store."""
+
+import bibtexparser
+from hamcrest import assert_that, is_
+
+from bibli_ls.database import BibliLibrary
+from bibli_ls.sqlite_store import SQLiteBibDatabase
+
+
+def make_library(bibtex: str, path: str) -> BibliLibrary:
+    return BibliLibrary(bibtexparser.parse_string(bibtex).blocks, path)
+
+
+def keys(found) -> list[str]:
+    return [entry.key for entry, _ in found]
+
+
+def test_store_precedence(tmp_path):
+    """Test that the first backend defining a key wins, also after a reload"""
+
+    path = str(tmp_path / "library.sqlite3")
+    db = SQLiteBibDatabase(path, ["first", "second"])
+    lib1 = make_library("@book{a, title={A1}, note={N}}\n@book{b, title={B1}}", "1")
+    lib2 = make_library("@book{a, title={A2}}\n@book{c, title={C2}}", "two.bib")
+    lib3 = make_library("@book{c, title={C3}}", "three.bib")
+    db.set_libraries("first", [lib1, lib2])
+    db.set_libraries("second", [lib3])
+
+    entry, library = db.find_in_libraries("a")
+    assert entry
+    assert_that(library, is_(lib1))
+    assert_that(list(entry.items()), is_([("title", "A1"), ("note", "N")]))
+    assert_that(db.find_in_libraries("c")[0]["title"], is_("C2"))
+    assert_that(db.find_in_libraries("d"), is_((None, None)))
+
+    # Entries are no longer held in memory
+    assert_that(lib1.entries, is_([]))
+
+    reloaded = make_library("@book{b, title={B2}}", "1")
+    db.set_libraries("first", [reloaded, lib2])
+    assert_that(db.find_in_libraries("a")[0]["title"], is_("A2"))
+    assert_that(db.find_in_libraries("b")[1], is_(reloaded))
+    assert_that(db.find_in_libraries("b")[0]["title"], is_("B2"))
+
+
+def test_store_shadowed(tmp_path):
+    """Test that entries hidden by an earlier definition of their key are
+    reported, as by the in-memory index"""
+
+    path = str(tmp_path / "library.sqlite3")
+    db = SQLiteBibDatabase(path, ["first", "second"])
+    lib1 = make_library("@book{a, title={A1}}\n@book{b, title={B1}}", "one.bib")
+    lib2 = make_library("@book{a, title={A2}}\n@book{c, title={C2}}", "two.bib")
+    lib3 = make_library("@book{c, title={C3}}\n@book{a, title={A3}}", "three.bib")
+    db.set_libraries("second", [lib3])
+    db.set_libraries("first", [lib1, lib2])
+
+    def shadowed(db: SQLiteBibDatabase) -> dict[str, list[str]]:
+        return {
+            key: [entry["title"] for entry, _ in entries]
+            for key, entries in db.shadowed.items()
+        }
+
+    assert_that(shadowed(db), is_({"a": ["A2", "A3"], "c": ["C3"]}))
+    assert_that(db.shadowed["c"][0][1], is_(lib3))
+
+    db.set_libraries("second", [make_library("@book{d, title={D3}}", "three.bib")])
+    assert_that(shadowed(db), is_({"a": ["A2"]}))
+    db.store.close()
+
+    # Also for the libraries stored by an earlier session
+    db = SQLiteBibDatabase(path, ["first", "second"])
+    assert_that(shadowed(db), is_({"a": ["A2"]}))
+
+
+def test_store_reopen(tmp_path):
+    """Test that stored libraries are served by the next session, and that
+    backends no longer configured are dropped"""
+
+    path = str(tmp_path / "library.sqlite3")
+    db = SQLiteBibDatabase(path, ["first", "second"])
+    db.set_libraries("first", [make_library("@book{a, title={A1}}", "one.bib")])
+    db.set_libraries("second", [make_library("@book{b, title={B1}}", "two.bib")])
+    db.store.close()
+
+    db = SQLiteBibDatabase(path, ["first"])
+    assert_that(list(db.libraries), is_(["first"]))
+    entry, library = db.find_in_libraries("a")
+    assert entry and library
+    assert_that(str(library.path), is_("one.bib"))
+    assert_that(db.find_in_libraries("b"), is_((None, None)))
+
+    # A library loaded again by its backend replaces the stored one
+    db.set_libraries("first", [make_library("@book{c, title={C1}}", "one.bib")])
+    assert_that(db.find_in_libraries("a"), is_((None, None)))
+    assert_that(db.find_in_libraries("c")[0]["title"], is_("C1"))
+
+
+def test_store_backend_order(tmp_path):
+    """Test that precedence follows the configured order of the backends,
+    not the order they were loaded or stored in"""
+
+    path = str(tmp_path / "library.sqlite3")
+    db = SQLiteBibDatabase(path, ["first", "second"])
+    db.set_libraries("second", [make_library("@book{a, title={A2}}", "two.bib")])
+    db.set_libraries("first", [make_library("@book{a, title={A1}}", "one.bib")])
+    assert_that(list(db.libraries), is_(["first", "second"]))
+    assert_that(db.find_in_libraries("a")[0]["title"], is_("A1"))
+    db.store.close()
+
+    db = SQLiteBibDatabase(path, ["second", "first"])
+    assert_that(list(db.libraries), is_(["second", "first"]))
+    assert_that(db.find_in_libraries("a")[0]["title"], is_("A2"))
+
+
+def test_store_search(tmp_path):
+    """Test that candidates are found by prefix, substring, author or title,
+    then fuzzy match of the citekey"""
+
+    db = SQLiteBibDatabase(str(tmp_path / "library.sqlite3"), ["first"])
+    db.set_libraries(
+        "first",
+        [
+            make_library(
+                "@book{smith2020, title={Deep Learning}, author={Smith, Ann}}\n"
+                "@book{doe2021, title={Shallow Thoughts}, author={Doe, Jon}}\n"
+                "@book{Smithers1999, title={Nuclear Power}, author={Smithers, W}}\n"
+                "@book{other, title={Deeper Learning}, abstract={smith}}\n",
+                "one.bib",
+            )
+        ],
+    )
+
+    assert_that(
+        keys(db.search("", 0)), is_(["smith2020", "doe2021", "Smithers1999", "other"])
+    )
+    assert_that(keys(db.search("", 2)), is_(["smith2020", "doe2021"]))
+    assert_that(keys(db.search("smith", 0)), is_(["smith2020", "Smithers1999"]))
+    assert_that(keys(db.search("2", 0)), is_(["smith2020", "doe2021"]))
+    assert_that(keys(db.search("deep lea", 0)), is_(["smith2020", "other"]))
+    assert_that(keys(db.search("shallow", 0)), is_(["doe2021"]))
+    assert_that(keys(db.search("oth", 0)), is_(["other"]))
+    assert_that(keys(db.search("sm20", 0)), is_(["smith2020"]))
+    assert_that(keys(db.search('"[*', 0)), is_([]))
@@ -0,0 +1,80 @@
+"""Test watching the workspace for changed files."""
+
+import os
+import threading
+import time
+
+from hamcrest import assert_that, has_item, is_, not_
+
+from bibli_ls import watcher
+from bibli_ls.watcher import WorkspaceWatcher
+
+
+class Changes:
+    def __init__(self):
+        self.paths: list[str] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path: str):
+        with self._lock:
+            self.paths.append(path)
+
+    def wait_for(self, path: str, timeout: float = 5) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if path in self.paths:
+                    return True
+            time.sleep(0.05)
+        return False
+
+
+def test_workspace_watcher(tmp_path):
+    """Test that files changed in new and moved directories are reported, and
+    not the ones in ignored directories"""
+
+    root = os.path.realpath(tmp_path)
+    for d in ["notes", "node_modules", ".git"]:
+        os.mkdir(os.path.join(root, d))
+
+    changes = Changes()
+    workspace_watcher = WorkspaceWatcher(changes)
+    workspace_watcher.start(root)
+    try:
+        assert_that(sorted(workspace_watcher._watches), is_([root, f"{root}/notes"]))
+
+        for path in [f"{root}/node_modules/a.md", f"{root}/.git/a.md"]:
+            with open(path, "w") as f:
+                f.write("@ignored")
+
+        os.makedirs(f"{root}/new/deeper")
+        with open(f"{root}/new/deeper/a.md", "w") as f:
+            f.write("@new")
+        assert changes.wait_for(f"{root}/new/deeper/a.md")
+
+        os.rename(f"{root}/new", f"{root}/moved")
+        assert changes.wait_for(f"{root}/new/deeper/a.md")
+        assert changes.wait_for(f"{root}/moved/deeper/a.md")
+
+        with open(f"{root}/moved/deeper/b.md", "w") as f:
+            f.write("@moved")
+        assert changes.wait_for(f"{root}/moved/deeper/b.md")
+        assert_that(workspace_watcher._watches, not_(has_item(f"{root}/new")))
+    finally:
+        workspace_watcher.stop()
+
+    assert_that(changes.paths, not_(has_item(f"{root}/node_modules/a.md")))
+    assert_that(changes.paths, not_(has_item(f"{root}/.git/a.md")))
+
+
+def test_workspace_watcher_limit(tmp_path, monkeypatch):
+    """Test that failing to watch the workspace is not an error"""
+
+    class FailingObserver(watcher.Observer):
+        def schedule(self, *args, **kwargs):
+            raise OSError(28, "inotify watch limit reached")
+
+    monkeypatch.setattr(watcher, "Observer", FailingObserver)
+    workspace_watcher = WorkspaceWatcher(Changes())
+    workspace_watcher.start(str(tmp_path))
+    assert_that(workspace_watcher._observer, is_(None))
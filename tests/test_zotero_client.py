@@ -0,0 +1,60 @@
+"""Test the Zotero web API client."""
+
+import pytest
+import requests
+from hamcrest import assert_that, greater_than_or_equal_to, is_
+
+from bibli_ls.backends import zotero_client
+from bibli_ls.backends.zotero_client import ZoteroClient
+from tests.zotero_api import ZoteroLibrary, ZoteroServer
+
+
+def make_client(server: ZoteroServer) -> ZoteroClient:
+    return ZoteroClient("1", "user", "key", endpoint=server.endpoint)
+
+
+def test_retry_transient_errors(monkeypatch):
+    """Test that transient errors are retried, waiting as long as asked"""
+
+    monkeypatch.setattr(zotero_client, "ZOTERO_RETRY_DELAY", 0.01)
+    with ZoteroServer(ZoteroLibrary()) as server:
+        server.failures = [(503, {"Retry-After": "0.2"}), (500, {})]
+        response = make_client(server).get("/deleted", {"since": 0})
+
+        assert_that(response.json(), is_({"items": []}))
+        assert_that(len(server.request_times), is_(3))
+        first, second, _ = server.request_times
+        assert_that(second - first, greater_than_or_equal_to(0.2))
+
+
+def test_give_up_retrying(monkeypatch):
+    """Test that a request failing every time raises after a few attempts"""
+
+    monkeypatch.setattr(zotero_client, "ZOTERO_RETRY_DELAY", 0.01)
+    with ZoteroServer(ZoteroLibrary()) as server:
+        server.failures = [(500, {})] * 10
+        with pytest.raises(requests.HTTPError):
+            make_client(server).get("/deleted")
+        assert_that(len(server.request_times), is_(zotero_client.ZOTERO_MAX_ATTEMPTS))
+
+        # Client errors are not retried
+        server.failures = [(403, {})]
+        with pytest.raises(requests.HTTPError):
+            make_client(server).get("/deleted")
+        assert_that(
+            len(server.request_times), is_(zotero_client.ZOTERO_MAX_ATTEMPTS + 1)
+        )
+
+
+def test_backoff():
+    """Test that a Backoff header holds back the next requests"""
+
+    with ZoteroServer(ZoteroLibrary()) as server:
+        client = make_client(server)
+        server.headers = {"Backoff": "0.3"}
+        client.get("/items")
+        server.headers = {}
+        client.get("/items")
+
+        first, second = server.request_times
+        assert_that(second - first, greater_than_or_equal_to(0.3))
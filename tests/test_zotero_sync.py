@@ -0,0 +1,206 @@
+"""Test syncing Zotero libraries."""
+
+import time
+
+from hamcrest import assert_that, is_, less_than
+from lsprotocol import types
+
+from bibli_ls import server as bibli_server
+from bibli_ls.backends.zotero_backend import ZoteroBackend
+from bibli_ls.bibli_config import DEFAULT_ZOTERO_FETCH_WORKERS, BackendConfig
+from bibli_ls.database import BibliBibDatabase
+from tests.utils import as_uri
+from tests.zotero_api import ZoteroLibrary, ZoteroServer, make_language_server
+
+
+def bibtex(key: str, title: str) -> str:
+    return f"\n@article{{{key},\n\ttitle = {{{title}}},\n}}\n"
+
+
+def make_backend(
+    tmp_path, server: ZoteroServer, fetch_workers: int = 4, cache_max_age: int = 0
+) -> ZoteroBackend:
+    config = BackendConfig(
+        backend_type="zotero_api",
+        library_id="1",
+        api_key="key",
+        cache=False,
+        fetch_workers=fetch_workers,
+        cache_max_age=cache_max_age,
+    )
+    backend = ZoteroBackend("zotero", config, make_language_server(tmp_path))
+    backend._client.endpoint = server.endpoint
+    return backend
+
+
+def titles(backend: ZoteroBackend) -> dict[str, str]:
+    (library,) = backend.get_libraries()
+    return {e.key: e.fields_dict["title"].value for e in library.entries}
+
+
+def test_delta_sync(tmp_path):
+    """Test that only the items changed since the last sync are fetched and
+    merged into the cache file"""
+
+    library = ZoteroLibrary()
+    for i in range(150):
+        library.set_item(f"ITEM{i}", bibtex(f"key{i}", f"Title {i}"))
+    library.set_item("NOTE", "")
+
+    with ZoteroServer(library) as server:
+        expected = {f"key{i}": f"Title {i}" for i in range(150)}
+        assert_that(titles(make_backend(tmp_path, server)), is_(expected))
+
+        library.set_item("ITEM1", bibtex("key1", "New title"))
+        library.set_item("ITEM2", bibtex("renamed2", "Title 2"))
+        library.delete_item("ITEM3")
+        library.set_item("ITEM150", bibtex("key150", "Title 150"))
+        library.requests.clear()
+
+        expected["key1"] = "New title"
+        expected["renamed2"] = expected.pop("key2")
+        expected.pop("key3")
+        expected["key150"] = "Title 150"
+        assert_that(titles(make_backend(tmp_path, server)), is_(expected))
+
+        # Only changes were requested
+        items_requests = [p for path, p in library.requests if path.endswith("/items")]
+        assert_that([p.get("since") for p in items_requests], is_(["151"]))
+
+        # The merged cache file is used as is on startup
+        (cached,) = make_backend(tmp_path, server).get_libraries_cached()
+        assert_that(
+            {e.key: e.fields_dict["title"].value for e in cached.entries},
+            is_(expected),
+        )
+
+        library.requests.clear()
+        assert_that(titles(make_backend(tmp_path, server)), is_(expected))
+        assert_that([path for path, _ in library.requests], is_(["/users/1/items"]))
+
+
+def test_definition_after_delta_sync(tmp_path, monkeypatch):
+    """Test that definitions point at the keys in the merged cache file"""
+
+    library = ZoteroLibrary()
+    for i in range(5):
+        library.set_item(f"ITEM{i}", bibtex(f"key{i}", f"Title {i}"))
+
+    with ZoteroServer(library) as server:
+        titles(make_backend(tmp_path, server))
+
+        library.delete_item("ITEM1")
+        library.set_item("ITEM5", bibtex("key5", "Title 5"))
+        (synced,) = make_backend(tmp_path, server).get_libraries()
+
+    database = BibliBibDatabase()
+    database.set_libraries("zotero", [synced])
+    monkeypatch.setattr(bibli_server, "DATABASE", database)
+
+    keys = ["key0", "key2", "key3", "key4", "key5"]
+    document = tmp_path / "document.md"
+    document.write_text("".join(f"@{key}\n" for key in keys))
+    ls = make_language_server(tmp_path)
+
+    assert synced.path
+    lines = synced.path.read_text().splitlines()
+    for line_no, key in enumerate(keys):
+        (location,) = bibli_server.goto_definition(
+            ls,  # type: ignore
+            types.DefinitionParams(
+                types.TextDocumentIdentifier(as_uri(document)),
+                types.Position(line=line_no, character=2),
+            ),
+        )
+        start, end = location.range.start, location.range.end
+        assert_that(lines[start.line][start.character : end.character + 1], is_(key))
+
+
+def test_revalidate_cache(tmp_path):
+    """Test that the cache file is served as is, then only synced again when
+    the library changed"""
+
+    library = ZoteroLibrary()
+    library.set_item("A", bibtex("smith2020", "First"))
+
+    with ZoteroServer(library) as server:
+        titles(make_backend(tmp_path, server))
+        library.requests.clear()
+
+        backend = make_backend(tmp_path, server)
+        (cached,) = backend.get_libraries_cached()
+        assert_that([e.key for e in cached.entries], is_(["smith2020"]))
+        assert_that(library.requests, is_([]))
+
+        assert_that(backend.is_cache_stale(), is_(True))
+        assert_that(backend.revalidate(), is_(None))
+        assert_that(len(library.requests), is_(1))
+
+        # Checked recently enough
+        assert_that(
+            make_backend(tmp_path, server, cache_max_age=60).is_cache_stale(),
+            is_(False),
+        )
+
+        library.set_item("B", bibtex("doe2021", "Second"))
+        updated = backend.revalidate()
+        assert updated
+        assert_that([e.key for e in updated[0].entries], is_(["smith2020", "doe2021"]))
+        assert_that(backend.revalidate(), is_(None))
+
+
+def test_citekey_conflict_falls_back(tmp_path):
+    """Test that the whole library is fetched when changes cannot be merged"""
+
+    library = ZoteroLibrary()
+    library.set_item("A", bibtex("smith2020", "First"))
+    library.set_item("B", bibtex("doe2021", "Second"))
+
+    with ZoteroServer(library) as server:
+        titles(make_backend(tmp_path, server))
+
+        library.set_item("C", bibtex("smith2020", "Third"))
+        library.requests.clear()
+
+        assert_that(
+            titles(make_backend(tmp_path, server)),
+            is_({"smith2020": "First", "doe2021": "Second"}),
+        )
+        items_requests = [p for path, p in library.requests if path.endswith("/items")]
+        assert_that([p.get("since") for p in items_requests], is_(["2", None]))
+
+
+def test_concurrent_fetch(tmp_path):
+    """Test that pages are fetched concurrently, in order"""
+
+    library = ZoteroLibrary()
+    for i in range(1000):
+        library.set_item(f"ITEM{i}", bibtex(f"key{i}", f"Title {i}"))
+
+    with ZoteroServer(library, latency=0.1) as server:
+        durations = {}
+        for workers in [1, 5]:
+            root = tmp_path / str(workers)
+            root.mkdir()
+            start = time.perf_counter()
+            (synced,) = make_backend(root, server, workers).get_libraries()
+            durations[workers] = time.perf_counter() - start
+            assert_that(
+                [e.key for e in synced.entries], is_([f"key{i}" for i in range(1000)])
+            )
+
+    # 10 pages: 1 + 9 sequential round trips against 1 + 2
+    assert_that(durations[5], less_than(durations[1] / 2))
+
+
+def test_default_fetch_workers(tmp_path):
+    """Test that `0` fetch workers uses the default"""
+
+    library = ZoteroLibrary()
+    for i in range(150):
+        library.set_item(f"ITEM{i}", bibtex(f"key{i}", f"Title {i}"))
+
+    with ZoteroServer(library) as server:
+        backend = make_backend(tmp_path, server, fetch_workers=0)
+        assert_that(backend.get_fetch_workers(), is_(DEFAULT_ZOTERO_FETCH_WORKERS))
+        assert_that(len(titles(backend)), is_(150))
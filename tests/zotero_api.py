@@ -0,0 +1,132 @@
+"""Local stand-in for the Zotero web API, serving a library held in memory."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from pygls.lsp.server import LanguageServer
+from pygls.workspace import Workspace
+
+from tests.utils import as_uri
+
+
+class ZoteroLibrary:
+    """Items of a Zotero library, with the versions they were modified at."""
+
+    def __init__(self):
+        self.version = 0
+        self.items: dict[str, tuple[int, str]] = {}
+        self.deleted: dict[str, int] = {}
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+    def set_item(self, key: str, bibtex: str):
+        self.version += 1
+        self.items[key] = (self.version, bibtex)
+
+    def delete_item(self, key: str):
+        self.version += 1
+        del self.items[key]
+        self.deleted[key] = self.version
+
+
+class ZoteroRequestHandler(BaseHTTPRequestHandler):
+    server: "ZoteroServer"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        library = self.server.library
+        library.requests.append((url.path, params))
+        self.server.request_times.append(time.monotonic())
+        time.sleep(self.server.latency)
+
+        if self.server.failures:
+            status, headers = self.server.failures.pop(0)
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        modified_since = self.headers.get("If-Modified-Since-Version")
+        if modified_since and int(modified_since) >= library.version:
+            self.send_response(304)
+            self.send_header("Last-Modified-Version", str(library.version))
+            self.end_headers()
+            return
+
+        since = int(params.get("since", 0))
+        total = None
+        if url.path.endswith("/items/trash"):
+            body = {} if params.get("format") == "versions" else []
+        elif url.path.endswith("/deleted"):
+            body = {"items": [k for k, v in library.deleted.items() if v > since]}
+        elif url.path.endswith("/items"):
+            items = sorted(
+                (version, key, bibtex)
+                for key, (version, bibtex) in library.items.items()
+                if version > since
+            )
+            total = len(items)
+            start = int(params.get("start", 0))
+            limit = int(params.get("limit", 100))
+            body = [
+                {"key": key, "version": version, "bibtex": bibtex, "data": {}}
+                for version, key, bibtex in items[start : start + limit]
+            ]
+        else:
+            self.send_error(404)
+            return
+
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Last-Modified-Version", str(library.version))
+        if total is not None:
+            self.send_header("Total-Results", str(total))
+        for k, v in self.server.headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ZoteroServer(ThreadingHTTPServer):
+    """Serve `library`, answering every request after `latency` seconds"""
+
+    def __init__(self, library: ZoteroLibrary, latency: float = 0):
+        super().__init__(("127.0.0.1", 0), ZoteroRequestHandler)
+        self.library = library
+        self.latency = latency
+        self.request_times: list[float] = []
+        # Status and headers of the next failing responses
+        self.failures: list[tuple[int, dict[str, str]]] = []
+        # Headers added to successful responses
+        self.headers: dict[str, str] = {}
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def make_language_server(root_path) -> LanguageServer:
+    """A language server which is not connected to a client, with its
+    workspace at `root_path`"""
+    ls = LanguageServer("bibli-test", "0.1")
+    ls.protocol._workspace = Workspace(as_uri(root_path))
+    return ls